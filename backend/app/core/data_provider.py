@@ -1,15 +1,74 @@
 
+import asyncio
 import logging
-import akshare as ak
+import re
+import numpy as np
 import pandas as pd
+import lxml.html
+from lxml import etree
 import requests
-from io import StringIO
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from typing import List, Dict, Any, Optional
 from enum import Enum
 import time
+from app.utils.cache import ttl_cache
+from app.utils.timeout import call_with_timeout
 
 logger = logging.getLogger(__name__)
 
+# Precompiled parsers for the THS scrape path
+_UNIT_RE = re.compile(r'^\s*(-?\d+(?:\.\d+)?)\s*([亿万]?)\s*$')  # "1.23亿" -> ("1.23", "亿")
+_THS_ROWS_XPATH = etree.XPath("//table[contains(@class,'m-table')]//tr[td]")
+
+# Shared keep-alive session for THS scraping (pooled connections + retry with backoff)
+_session = requests.Session()
+_adapter = HTTPAdapter(
+    pool_connections=10,
+    pool_maxsize=20,
+    max_retries=Retry(total=2, backoff_factor=0.3, status_forcelist=[502, 503, 504]),
+)
+_session.mount("http://", _adapter)
+_session.mount("https://", _adapter)
+_session.headers.update({
+    "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+})
+
+
+def _numeric_column(df: pd.DataFrame, column: str) -> np.ndarray:
+    """Coerce a column to float64, mapping missing columns and unparsable cells to 0."""
+    if column not in df.columns:
+        return np.zeros(len(df))
+    return pd.to_numeric(df[column], errors='coerce').fillna(0).to_numpy(dtype=np.float64)
+
+
+def _rank_concept_stocks(
+    codes: np.ndarray,
+    names: np.ndarray,
+    price: np.ndarray,
+    chg: np.ndarray,
+    turnover: np.ndarray,
+    limit: Optional[int] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Sort parsed constituent columns by change_pct desc (stable, like list.sort)
+    and build records for the top `limit` rows only.
+    """
+    order = np.argsort(-chg, kind='stable')
+    if limit is not None:
+        order = order[:limit]
+    return [
+        {"code": c, "name": n, "price": p, "change_pct": ch, "turnover": t}
+        for c, n, p, ch, t in zip(
+            codes[order].tolist(),
+            names[order].tolist(),
+            price[order].tolist(),
+            chg[order].tolist(),
+            turnover[order].tolist(),
+        )
+    ]
+
+
 class DataProvider:
     """
     Centralized data provider with failover strategies.
@@ -19,79 +78,136 @@ class DataProvider:
     _ths_concept_map = {} # Name -> Code
 
     @staticmethod
+    def _fetch_concepts_em() -> List[str]:
+        """Concept names from EastMoney. Raises on failure."""
+        import akshare as ak
+        df = call_with_timeout(ak.stock_board_concept_name_em)
+        return df['板块名称'].tolist()
+
+    @staticmethod
+    def _fetch_concepts_ths() -> List[str]:
+        """Concept names from Tonghuashun (and cache mapping). Raises on failure."""
+        import akshare as ak
+        df = call_with_timeout(ak.stock_board_concept_name_ths)
+        # Cache the mapping for later use in get_concept_stocks
+        # df columns: ['name', 'url'] or ['name', 'code'] ?
+        # Based on debug output: ['name', 'code']
+        if 'code' in df.columns:
+            DataProvider._ths_concept_map = dict(zip(df['name'], df['code']))
+        elif 'url' in df.columns:
+            # Extract code from url if needed, but 'code' column is preferred
+            pass
+        
+        return df['name'].tolist()
+
+    @staticmethod
+    @ttl_cache(ttl=60)
     def get_all_concepts() -> List[str]:
         """
         Fetch all concept names.
         Prioritizes EastMoney, falls back to Tonghuashun.
+        Raises if neither source returns concepts, so an empty list is never cached
+        (ttl_cache serves the last good list instead, if there is one).
         """
         # 1. Try EastMoney
         try:
             # logger.info("Fetching concepts from EastMoney...")
-            df = ak.stock_board_concept_name_em()
-            return df['板块名称'].tolist()
+            concepts = DataProvider._fetch_concepts_em()
+            if concepts:
+                return concepts
+            logger.warning("EastMoney returned no concepts")
         except Exception as e:
             logger.warning(f"EastMoney concept fetch failed: {e}")
 
-        # 2. Try Tonghuashun (and cache mapping)
+        # 2. Try Tonghuashun
         try:
             # logger.info("Fetching concepts from Tonghuashun...")
-            df = ak.stock_board_concept_name_ths()
-            # Cache the mapping for later use in get_concept_stocks
-            # df columns: ['name', 'url'] or ['name', 'code'] ?
-            # Based on debug output: ['name', 'code']
-            if 'code' in df.columns:
-                DataProvider._ths_concept_map = dict(zip(df['name'], df['code']))
-            elif 'url' in df.columns:
-                # Extract code from url if needed, but 'code' column is preferred
-                pass
-            
-            return df['name'].tolist()
+            concepts = DataProvider._fetch_concepts_ths()
         except Exception as e:
             logger.error(f"Tonghuashun concept fetch failed: {e}")
+            raise
+        if not concepts:
+            raise RuntimeError("No concepts returned by EastMoney or Tonghuashun")
+        return concepts
+
+    @staticmethod
+    async def get_all_concepts_async(timeout: float = 5.0) -> List[str]:
+        """
+        Fetch all concept names by racing EastMoney and Tonghuashun.
+        Returns the first non-empty result; worst case is bounded by `timeout`
+        instead of the sum of both sources.
+        """
+        tasks = [
+            asyncio.create_task(asyncio.wait_for(asyncio.to_thread(fetch), timeout))
+            for fetch in (DataProvider._fetch_concepts_em, DataProvider._fetch_concepts_ths)
+        ]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                try:
+                    concepts = await next_done
+                except Exception as e:
+                    logger.warning(f"Concept source failed in race: {e!r}")
+                    continue
+                if concepts:
+                    return concepts
             return []
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    # Column layout of the THS concept detail table
+    _THS_COLUMNS = [
+        '序号', '代码', '名称', '现价', '涨跌幅(%)', '涨跌', '涨速(%)', '换手(%)',
+        '量比', '振幅(%)', '成交额', '流通股', '流通市值', '市盈率',
+    ]
 
     @staticmethod
     def _scrape_ths_concept(concept_code: str) -> pd.DataFrame:
         url = f"http://q.10jqka.com.cn/gn/detail/code/{concept_code}/"
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
-        }
         try:
-            r = requests.get(url, headers=headers, timeout=10)
-            target_encoding = 'gbk'
-            r.encoding = target_encoding
-            dfs = pd.read_html(StringIO(r.text))
-            if dfs:
-                return dfs[0]
+            r = _session.get(url, timeout=10)
+            # Only the stock table is needed; skip read_html's whole-page table inference
+            root = lxml.html.fromstring(r.content.decode('gbk', 'ignore'))
+            columns = DataProvider._THS_COLUMNS
+            rows = []
+            for tr in _THS_ROWS_XPATH(root):
+                cells = [td.text_content().strip() for td in tr.findall('td')]
+                if len(cells) >= len(columns):
+                    rows.append(cells[:len(columns)])
+            if rows:
+                return pd.DataFrame(rows, columns=columns)
         except Exception as e:
             logger.error(f"Scraping THS {concept_code} failed: {e}")
         return pd.DataFrame()
 
     @staticmethod
-    def get_concept_stocks(concept_name: str) -> List[Dict[str, Any]]:
+    @ttl_cache(ttl=30)
+    def get_concept_stocks(concept_name: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
         """
-        Fetch stocks for a concept.
+        Fetch stocks for a concept, sorted by change_pct desc.
         Prioritizes EastMoney, falls back to Tonghuashun Scraper.
+        If `limit` is given, only the top `limit` rows are built.
         """
+        import akshare as ak
+
         # 1. Try EastMoney
         try:
             # logger.info(f"Fetching '{concept_name}' stocks from EastMoney...")
-            df = ak.stock_board_concept_cons_em(symbol=concept_name)
-            result = []
-            for _, row in df.iterrows():
-                try:
-                    res_item = {
-                        "code": row['代码'],
-                        "name": row['名称'],
-                        "price": float(row['最新价']),
-                        "change_pct": float(row['涨跌幅']),
-                        "turnover": float(row['成交额']) if '成交额' in row else 0,
-                    }
-                    result.append(res_item)
-                except ValueError:
-                    continue
-            result.sort(key=lambda x: x['change_pct'], reverse=True)
-            return result
+            df = call_with_timeout(ak.stock_board_concept_cons_em, symbol=concept_name)
+            codes = df['代码'].to_numpy()
+            names = df['名称'].to_numpy()
+            price = pd.to_numeric(df['最新价'], errors='coerce').to_numpy()
+            chg = pd.to_numeric(df['涨跌幅'], errors='coerce').to_numpy()
+            if '成交额' in df.columns:
+                turnover = np.nan_to_num(pd.to_numeric(df['成交额'], errors='coerce').to_numpy())
+            else:
+                turnover = np.zeros(len(df))
+
+            # Drop unparsable rows
+            valid = ~(np.isnan(price) | np.isnan(chg))
+            return _rank_concept_stocks(
+                codes[valid], names[valid], price[valid], chg[valid], turnover[valid], limit
+            )
         except Exception as e:
             logger.warning(f"EastMoney '{concept_name}' fetch failed: {e}")
 
@@ -99,48 +215,31 @@ class DataProvider:
         # If mapping is empty, try to populate it (lazy load)
         if not DataProvider._ths_concept_map:
              try:
-                df_map = ak.stock_board_concept_name_ths()
+                df_map = call_with_timeout(ak.stock_board_concept_name_ths)
                 if 'code' in df_map.columns:
                      DataProvider._ths_concept_map = dict(zip(df_map['name'], df_map['code']))
-             except:
-                 pass
+             except Exception as e:
+                 logger.warning(f"THS concept map fetch failed: {e}")
 
         if concept_name in DataProvider._ths_concept_map:
             code = DataProvider._ths_concept_map[concept_name]
             logger.info(f"Scraping THS data for '{concept_name}' (Code: {code})")
             df = DataProvider._scrape_ths_concept(code)
             if not df.empty:
-                result = []
-                for _, row in df.iterrows():
-                    try:
-                        # THS columns: 序号 代码 名称 现价 涨跌幅(%) ... 成交额(亿) ...
-                        # Need to parse '成交额' which might have units
-                        # Columns: 序号 代码 名称 现价 涨跌幅(%) 涨跌 涨速(%) 换手(%) 量比 振幅(%) 成交额 流通股 流通市值 市盈率
-                        turnover_str = str(row.get('成交额', '0'))
-                        turnover = 0.0
-                        if '亿' in turnover_str:
-                            turnover = float(turnover_str.replace('亿', '')) * 1e8
-                        elif '万' in turnover_str:
-                             turnover = float(turnover_str.replace('万', '')) * 1e4
-                        
-                        price = row.get('现价', 0)
-                        if price == '--': price = 0
-                        
-                        change_pct = row.get('涨跌幅(%)', 0)
-                        if change_pct == '--': change_pct = 0
-                        
-                        res_item = {
-                            "code": str(row['代码']).zfill(6),
-                            "name": row['名称'],
-                            "price": float(price),
-                            "change_pct": float(change_pct),
-                            "turnover": turnover,
-                        }
-                        result.append(res_item)
-                    except Exception as parse_err:
-                        # logger.warning(f"Parse error: {parse_err}")
-                        continue
-                result.sort(key=lambda x: x['change_pct'], reverse=True)
-                return result
+                # THS columns: 序号 代码 名称 现价 涨跌幅(%) 涨跌 涨速(%) 换手(%) 量比 振幅(%) 成交额 流通股 流通市值 市盈率
+                # '成交额' carries units ("1.23亿" / "4567万"); '--' or a bare number -> 0, as before
+                codes = df['代码'].astype(str).str.zfill(6).to_numpy()
+                names = df['名称'].to_numpy()
+                price = _numeric_column(df, '现价')
+                chg = _numeric_column(df, '涨跌幅(%)')
+                if '成交额' in df.columns:
+                    parts = df['成交额'].astype(str).str.extract(_UNIT_RE)
+                    value = pd.to_numeric(parts[0], errors='coerce').fillna(0)
+                    unit = parts[1].map({'亿': 1e8, '万': 1e4}).fillna(0.0)
+                    turnover = (value * unit).to_numpy()
+                else:
+                    turnover = np.zeros(len(df))
+
+                return _rank_concept_stocks(codes, names, price, chg, turnover, limit)
         
         return []
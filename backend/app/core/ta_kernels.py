@@ -0,0 +1,34 @@
+"""
+Numeric kernels for technical indicators.
+Loops that cannot be expressed as pandas/NumPy vector ops live here so they can be JIT-compiled.
+"""
+
+from typing import Tuple
+
+import numpy as np
+
+from app.utils._njit import njit
+
+
+@njit(cache=True)
+def kdj_smooth(rsv: np.ndarray, k0: float = 50.0, d0: float = 50.0) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Recursive KDJ smoothing: K = 2/3*K + 1/3*RSV, D = 2/3*D + 1/3*K.
+    NaN RSV values (warm-up window) yield NaN and leave the running K/D untouched.
+    """
+    n = rsv.shape[0]
+    k_out = np.empty(n)
+    d_out = np.empty(n)
+    k = k0
+    d = d0
+    for i in range(n):
+        v = rsv[i]
+        if np.isnan(v):
+            k_out[i] = np.nan
+            d_out[i] = np.nan
+        else:
+            k = 2 / 3 * k + 1 / 3 * v
+            d = 2 / 3 * d + 1 / 3 * k
+            k_out[i] = k
+            d_out[i] = d
+    return k_out, d_out
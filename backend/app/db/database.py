@@ -1,13 +1,44 @@
+from sqlalchemy import delete, func, inspect, select
+from sqlalchemy.pool import QueuePool
 from sqlmodel import SQLModel, create_engine, Session
 
 sqlite_file_name = "nexus_trader.db"
 sqlite_url = f"sqlite:///{sqlite_file_name}"
 
 connect_args = {"check_same_thread": False}
-engine = create_engine(sqlite_url, connect_args=connect_args)
+# Agent loop, producers and request handlers all open short sessions from worker threads;
+# keep enough pooled connections that they don't churn. QueuePool is explicit because
+# SQLAlchemy 1.4 defaults file SQLite to NullPool, which rejects pool_size/max_overflow.
+engine = create_engine(
+    sqlite_url,
+    connect_args=connect_args,
+    poolclass=QueuePool,
+    pool_size=10,
+    max_overflow=20,
+)
+
+def _drop_duplicates_for(conn, table, index):
+    """Delete rows that would violate a new unique index, keeping the oldest (MIN(id)) of each group."""
+    keep = select(func.min(table.c.id)).group_by(*index.columns)
+    result = conn.execute(delete(table).where(table.c.id.not_in(keep)))
+    if result.rowcount:
+        print(f"[DB] Removed {result.rowcount} duplicate rows from {table.name} before creating {index.name}")
+
 
 def create_db_and_tables():
     SQLModel.metadata.create_all(engine)
+    # create_all skips tables that already exist; add indexes introduced since.
+    # Failures propagate: code relies on these indexes (e.g. ON CONFLICT needs ux_anomaly_event).
+    with engine.begin() as conn:
+        inspector = inspect(conn)
+        for table in SQLModel.metadata.sorted_tables:
+            existing = {ix["name"] for ix in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name in existing:
+                    continue
+                if index.unique:
+                    _drop_duplicates_for(conn, table, index)
+                index.create(conn)
 
 def get_session():
     with Session(engine) as session:
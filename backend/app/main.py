@@ -1,5 +1,6 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from contextlib import asynccontextmanager
 from app.db.database import create_db_and_tables
 from app.models.sentiment import SentimentRecord
@@ -19,10 +20,13 @@ app = FastAPI(
     title="NEXUS Trader API",
     description="Backend API for NEXUS Trader (A-Share Edition)",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse,
 )
 
-# Global Timeout for blocking operations (e.g. akshare/requests)
+# Global Timeout for blocking operations (e.g. akshare/requests).
+# Backstop for sockets opened without an explicit timeout; AkShare calls additionally get a
+# per-call deadline from app.utils.timeout.call_with_timeout.
 import socket
 socket.setdefaulttimeout(15)
 
@@ -1,8 +1,12 @@
 from typing import Optional
+from sqlalchemy import Index
 from sqlmodel import Field, SQLModel
 from datetime import datetime
 
 class AnomalyRecord(SQLModel, table=True):
+    # One row per EastMoney event; scans insert with ON CONFLICT DO NOTHING against this
+    __table_args__ = (Index("ux_anomaly_event", "code", "timestamp", "type", unique=True),)
+
     id: Optional[int] = Field(default=None, primary_key=True)
     timestamp: datetime = Field(default_factory=datetime.utcnow, index=True)
     code: str = Field(index=True)
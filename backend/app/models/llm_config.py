@@ -5,7 +5,7 @@ LLM 配置数据模型
 
 from enum import Enum
 from typing import Optional
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field, PrivateAttr, model_validator
 import uuid
 
 
@@ -106,6 +106,9 @@ class OAuthTokens(BaseModel):
 
 class ProviderConfig(BaseModel):
     """单个提供商的完整配置"""
+    # 赋值时重新校验, 保证掩码随 api_key / user_email 更新
+    model_config = ConfigDict(validate_assignment=True)
+
     id: str = Field(default_factory=lambda: str(uuid.uuid4())[:8])
     name: str
     type: ProviderType
@@ -121,13 +124,22 @@ class ProviderConfig(BaseModel):
     gcp_project_id: Optional[str] = None
     gcp_location: str = "us-central1"
 
+    _api_key_masked: str = PrivateAttr(default="***")
+
+    @model_validator(mode="after")
+    def _compute_masked_key(self) -> "ProviderConfig":
+        """写入时计算一次掩码, 读取路径直接返回"""
+        if self.auth_type == AuthType.OAUTH:
+            self._api_key_masked = f"OAuth ({self.user_email or 'connected'})"
+        elif not self.api_key or len(self.api_key) < 8:
+            self._api_key_masked = "***"
+        else:
+            self._api_key_masked = f"{self.api_key[:4]}...{self.api_key[-4:]}"
+        return self
+
     def get_masked_key(self) -> str:
         """返回掩码后的 API Key"""
-        if self.auth_type == AuthType.OAUTH:
-            return f"OAuth ({self.user_email or 'connected'})"
-        if not self.api_key or len(self.api_key) < 8:
-            return "***"
-        return f"{self.api_key[:4]}...{self.api_key[-4:]}"
+        return self._api_key_masked
 
 
 class ActiveModel(BaseModel):
@@ -188,10 +200,29 @@ class ProviderResponse(BaseModel):
             name=config.name,
             type=config.type,
             auth_type=config.auth_type,
-            api_key_masked=config.get_masked_key(),
+            api_key_masked=config._api_key_masked,
             base_url=config.base_url,
             models=config.models,
             enabled=config.enabled,
             user_email=config.user_email,
             user_avatar=config.user_avatar,
         )
+
+    @staticmethod
+    def rows_from_configs(configs: list[ProviderConfig]) -> list[dict]:
+        """列表接口用: 直接构造 dict, 跳过逐个模型校验"""
+        return [
+            {
+                "id": c.id,
+                "name": c.name,
+                "type": c.type.value,
+                "auth_type": c.auth_type.value,
+                "api_key_masked": c._api_key_masked,
+                "base_url": c.base_url,
+                "models": c.models,
+                "enabled": c.enabled,
+                "user_email": c.user_email,
+                "user_avatar": c.user_avatar,
+            }
+            for c in configs
+        ]
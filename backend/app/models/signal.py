@@ -1,9 +1,13 @@
+from sqlalchemy import Index
 from sqlmodel import Field, SQLModel
 from datetime import datetime
 from typing import Optional, Dict, Any
-import json
+import orjson
 
 class SignalRecord(SQLModel, table=True):
+    # Covers the agent's per-tick dedupe (timestamp range -> type, message) without touching rows
+    __table_args__ = (Index("ix_signal_dedupe", "timestamp", "type", "message"),)
+
     id: Optional[int] = Field(default=None, primary_key=True)
     timestamp: datetime = Field(default_factory=datetime.now, index=True)
     type: str = Field(index=True)  # sentiment_spike, anomaly_burst, leader_breakout
@@ -14,8 +18,8 @@ class SignalRecord(SQLModel, table=True):
 
     @property
     def meta(self) -> Dict[str, Any]:
-        return json.loads(self.metadata_json)
+        return orjson.loads(self.metadata_json)
 
     @meta.setter
     def meta(self, value: Dict[str, Any]):
-        self.metadata_json = json.dumps(value)
+        self.metadata_json = orjson.dumps(value).decode()
@@ -1,93 +1,127 @@
-import akshare as ak
+import numpy as np
 import pandas as pd
 import time
 from typing import List, Dict, Any, Optional
-from tenacity import retry, stop_after_attempt, wait_fixed
+from tenacity import retry, retry_if_not_exception_type, stop_after_attempt, wait_exponential
 from app.providers.base import MarketDataProvider
+from app.utils.cache import ttl_cache, TTL_ACTIVITY, TTL_MACRO, TTL_MACRO_DAY
+from app.utils.timeout import call_with_timeout
+
+@retry(
+    stop=stop_after_attempt(3),
+    wait=wait_exponential(multiplier=0.5, max=4),
+    retry=retry_if_not_exception_type(TimeoutError),  # a hung upstream won't recover in 1s
+    reraise=True,
+)
+def _call_ak(func, *args, **kwargs):
+    """
+    Run one AkShare fetch with a deadline, retrying transient failures with backoff.
+    Retries sit here (around the network call) because the public methods below
+    swallow exceptions and return empty results.
+    """
+    return call_with_timeout(func, *args, **kwargs)
+
+def _to_int(value) -> int:
+    """Count cell -> int: direct int() first, then via float ("12.0"); unparsable/NaN -> 0."""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        try:
+            return int(float(value))
+        except (TypeError, ValueError, OverflowError):
+            return 0
 
 class AkShareProvider(MarketDataProvider):
     """
     Implementation of MarketDataProvider using AkShare (Open Source Financial Data).
     """
 
-    @retry(stop=stop_after_attempt(2), wait=wait_fixed(1))
     def get_sector_heatmap_data(self) -> List[Dict[str, Any]]:
         """
         Fetch sector performance data for heatmap.
         Source: Tonghuashun (stock_board_industry_summary_ths)
         """
         try:
-            df = ak.stock_board_industry_summary_ths()
-            result = []
-            for _, row in df.iterrows():
-                try:
-                    result.append({
-                        "name": row['板块'],
-                        "code": row['板块'],
-                        "change_pct": float(row['涨跌幅']),
-                        "market_cap": float(row['总成交额']) * 100, 
-                        "turnover": 0,
-                        "leader_name": row['领涨股'],
-                        "leader_change": float(row['领涨股-涨跌幅'])
-                    })
-                except Exception:
-                    continue 
-            result.sort(key=lambda x: x['change_pct'], reverse=True)
+            import akshare as ak
+            df = _call_ak(ak.stock_board_industry_summary_ths)
+            chg = pd.to_numeric(df['涨跌幅'], errors='coerce').to_numpy(dtype=float)
+            amt = pd.to_numeric(df['总成交额'], errors='coerce').to_numpy(dtype=float)
+            lead_chg = pd.to_numeric(df['领涨股-涨跌幅'], errors='coerce').to_numpy(dtype=float)
+            # Malformed rows drop out via the mask; one stable argsort orders the rest
+            valid = ~(np.isnan(chg) | np.isnan(amt) | np.isnan(lead_chg))
+            idx = np.flatnonzero(valid)
+            idx = idx[np.argsort(-chg[idx], kind='stable')]
+            names = df['板块'].to_numpy()[idx]
+            leaders = df['领涨股'].to_numpy()[idx]
+            result = [
+                {
+                    "name": n,
+                    "code": n,
+                    "change_pct": c,
+                    "market_cap": m,
+                    "turnover": 0,
+                    "leader_name": l,
+                    "leader_change": lc,
+                }
+                for n, c, m, l, lc in zip(
+                    names, chg[idx].tolist(), (amt[idx] * 100).tolist(), leaders, lead_chg[idx].tolist()
+                )
+            ]
             return result
         except Exception as e:
             print(f"[AkShareProvider] Error fetching heatmap: {e}")
             return []
 
-    @retry(stop=stop_after_attempt(2), wait=wait_fixed(1))
-    def get_leader_stocks_data(self) -> List[Dict[str, Any]]:
+    def get_leader_stocks_data(self, min_change_pct: Optional[float] = None, limit: Optional[int] = None) -> List[Dict[str, Any]]:
         """
         Fetch leader/popular stocks.
         Source: EastMoney Popularity Rank (stock_hot_rank_em)
+        Filtering/limiting happens on the frame, so only the returned rows become dicts.
         """
         try:
-            df = ak.stock_hot_rank_em()
-            result = []
-            for _, row in df.iterrows():
-                try:
-                    change_pct = float(row['涨跌幅'])
-                    raw_code = str(row['代码'])
-                    code = raw_code[2:] if raw_code.startswith(("SZ", "SH", "BJ")) else raw_code
-                    rank = int(row['当前排名'])
-
-                    result.append({
-                        "code": code,
-                        "name": str(row['股票名称']),
-                        "price": float(row['最新价']),
-                        "change_pct": change_pct,
-                        "turnover": 0, 
-                        "volume_ratio": rank 
-                    })
-                except Exception:
-                    continue
+            import akshare as ak
+            df = _call_ak(ak.stock_hot_rank_em)
+            sub = pd.DataFrame({
+                "code": df['代码'].astype(str).str.replace(r'^(SZ|SH|BJ)', '', regex=True),
+                "name": df['股票名称'].astype(str),
+                "price": pd.to_numeric(df['最新价'], errors='coerce'),
+                "change_pct": pd.to_numeric(df['涨跌幅'], errors='coerce'),
+                "turnover": 0,
+                "volume_ratio": pd.to_numeric(df['当前排名'], errors='coerce'),
+            })
+            sub = sub.dropna(subset=["price", "change_pct", "volume_ratio"])
+            sub["volume_ratio"] = sub["volume_ratio"].astype(np.int32)  # ranks fit easily
+            if min_change_pct is not None:
+                sub = sub[sub["change_pct"].to_numpy() >= min_change_pct]
+            if limit is not None:
+                sub = sub.head(limit)
+            result = sub.to_dict('records')
             return result
         except Exception as e:
             print(f"[AkShareProvider] Error fetching leaders: {e}")
             return []
 
-    @retry(stop=stop_after_attempt(2), wait=wait_fixed(1))
+    @ttl_cache(ttl=TTL_ACTIVITY)  # Shared by market overview and sentiment
     def get_market_activity_data(self) -> Dict[str, Any]:
         """
         Fetch market activity metrics (up/down count, limit up/down).
         Source: Legu (stock_market_activity_legu)
         """
         try:
-            df = ak.stock_market_activity_legu()
-            data = dict(zip(df['item'], df['value']))
+            import akshare as ak
+            df = _call_ak(ak.stock_market_activity_legu)
+            data = dict(zip(df['item'].to_numpy(), df['value'].to_numpy()))
+            # Only the five counts are parsed; 活跃度 ("12.3%") and 统计日期 stay raw strings
             
-            activity_str = data.get("活跃度", "0%").strip('%')
+            activity_str = str(data.get("活跃度", "0%")).strip('%')
             activity = float(activity_str) if activity_str else 0.0
 
             return {
-                "up_count": int(float(data.get("上涨", 0))),
-                "down_count": int(float(data.get("下跌", 0))),
-                "flat_count": int(float(data.get("平盘", 0))),
-                "limit_up_count": int(float(data.get("涨停", 0))),
-                "limit_down_count": int(float(data.get("跌停", 0))),
+                "up_count": _to_int(data.get("上涨", 0)),
+                "down_count": _to_int(data.get("下跌", 0)),
+                "flat_count": _to_int(data.get("平盘", 0)),
+                "limit_up_count": _to_int(data.get("涨停", 0)),
+                "limit_down_count": _to_int(data.get("跌停", 0)),
                 "activity": activity,
                 "ts": data.get("统计日期", "")
             }
@@ -95,53 +129,54 @@ class AkShareProvider(MarketDataProvider):
             print(f"[AkShareProvider] Error fetching market activity: {e}")
             return {}
 
-    @retry(stop=stop_after_attempt(2), wait=wait_fixed(1))
     def get_economic_calendar(self, date_str: str = None) -> List[Dict[str, Any]]:
         """
         Fetch economic calendar events.
         Source: Baidu Economic Calendar (news_economic_baidu)
         """
+        # Resolve the date first so the cache key rolls over at midnight
+        today = time.strftime("%Y%m%d")
+        date_str = date_str or today
         try:
-            if not date_str:
-                date_str = time.strftime("%Y%m%d")
-            df = ak.news_economic_baidu(date=date_str)
-            df = df.fillna("")
-            
-            result = []
-            for _, row in df.iterrows():
-                result.append({
-                    "time": row['时间'],
-                    "country": row['地区'],
-                    "event": row['事件'],
-                    "actual": row['公布'],
-                    "forecast": row['预期'],
-                    "previous": row['前值'],
-                    "importance": row['重要性']
-                })
-            return result
+            if date_str == today:
+                # "actual" values are published during the day
+                return self._fetch_economic_calendar_today(date_str)
+            return self._fetch_economic_calendar_day(date_str)
         except Exception as e:
+            # Failures are raised below the caches so they are never cached as "no events"
             print(f"[AkShareProvider] Error fetching macro events: {e}")
             return []
 
-    @retry(stop=stop_after_attempt(2), wait=wait_fixed(1))
-    def get_market_anomalies(self) -> List[Dict[str, Any]]:
+    @ttl_cache(ttl=TTL_MACRO, maxsize=2)
+    def _fetch_economic_calendar_today(self, date_str: str) -> List[Dict[str, Any]]:
+        return self._fetch_economic_calendar(date_str)
+
+    @ttl_cache(ttl=TTL_MACRO_DAY, maxsize=128)  # Past/future dates rarely change; /macro/range adds one key per day
+    def _fetch_economic_calendar_day(self, date_str: str) -> List[Dict[str, Any]]:
+        return self._fetch_economic_calendar(date_str)
+
+    def _fetch_economic_calendar(self, date_str: str) -> List[Dict[str, Any]]:
+        """One day's events. Raises on failure (caught in get_economic_calendar)."""
+        import akshare as ak
+        df = _call_ak(ak.news_economic_baidu, date=date_str)
+        df = df.fillna("").rename(columns={
+            '时间': 'time', '地区': 'country', '事件': 'event', '公布': 'actual',
+            '预期': 'forecast', '前值': 'previous', '重要性': 'importance',
+        })
+        return df[['time', 'country', 'event', 'actual', 'forecast', 'previous', 'importance']].to_dict('records')
+
+    def get_market_anomalies_df(self) -> pd.DataFrame:
         """
-        Fetch real-time market anomalies.
-        Source: EastMoney Anomaly (stock_changes_em)
+        Raw anomaly frame with string columns: type, code, name, time, info.
+        Source: EastMoney Anomaly (stock_changes_em). Raises on failure.
         """
-        try:
-            df = ak.stock_changes_em()
-            # We return raw records here, processing should happen in service
-            result = []
-            for _, row in df.iterrows():
-                result.append({
-                    "type": str(row["板块"]),
-                    "code": str(row["代码"]),
-                    "name": str(row["名称"]),
-                    "time": str(row["时间"]),
-                    "info": str(row.get("相关信息", ""))
-                })
-            return result
-        except Exception as e:
-            print(f"[AkShareProvider] Error fetching anomalies: {e}")
-            return []
+        import akshare as ak
+        df = _call_ak(ak.stock_changes_em)
+        info = df["相关信息"] if "相关信息" in df.columns else pd.Series("", index=df.index)
+        return pd.DataFrame({
+            "type": df["板块"].astype(str),
+            "code": df["代码"].astype(str),
+            "name": df["名称"].astype(str),
+            "time": df["时间"].astype(str),
+            "info": info.astype(str),
+        })
@@ -1,6 +1,11 @@
+import asyncio
 from abc import ABC, abstractmethod
+from datetime import date, timedelta
 from typing import List, Dict, Any, Optional
 
+import pandas as pd
+
+
 class MarketDataProvider(ABC):
     """
     Abstract Base Class for Market Data Providers.
@@ -16,9 +21,10 @@ class MarketDataProvider(ABC):
         pass
 
     @abstractmethod
-    def get_leader_stocks_data(self) -> List[Dict[str, Any]]:
+    def get_leader_stocks_data(self, min_change_pct: Optional[float] = None, limit: Optional[int] = None) -> List[Dict[str, Any]]:
         """
-        Fetch leader/popular stocks.
+        Fetch leader/popular stocks, in source rank order.
+        Optionally keep only rows with change_pct >= `min_change_pct`, and at most `limit` of them.
         Expected return format: [{"code": str, "name": str, "price": float, "change_pct": float, "volume_ratio": float}, ...]
         """
         pass
@@ -38,9 +44,27 @@ class MarketDataProvider(ABC):
         """
         pass
 
+    async def get_economic_calendar_range(self, start: date, end: date, concurrency: int = 5) -> List[Dict[str, Any]]:
+        """
+        Fetch economic calendar events for every day in [start, end].
+        Days are fetched concurrently (at most `concurrency` in flight) and each event is tagged with its date.
+        """
+        sem = asyncio.Semaphore(concurrency)
+
+        async def one(day: date) -> List[Dict[str, Any]]:
+            date_str = day.strftime("%Y%m%d")
+            async with sem:
+                events = await asyncio.to_thread(self.get_economic_calendar, date_str)
+            return [{**e, "date": date_str} for e in events]
+
+        days = [start + timedelta(days=i) for i in range((end - start).days + 1)]
+        results = await asyncio.gather(*(one(d) for d in days))
+        return [e for day_events in results for e in day_events]
+
     @abstractmethod
-    def get_market_anomalies(self) -> List[Dict[str, Any]]:
+    def get_market_anomalies_df(self) -> pd.DataFrame:
         """
-        Fetch real-time market anomalies (rocket, dive, big order).
+        Fetch real-time market anomalies (rocket, dive, big order) as a DataFrame with
+        columns type, code, name, time, info (for vectorized filtering). Raises on failure.
         """
         pass
@@ -1,5 +1,7 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from app.services.agent_service import AgentService
+from app.services.agent_llm import AgentLLM
 
 router = APIRouter()
 
@@ -7,4 +9,17 @@ router = APIRouter()
 def get_signals(limit: int = 10):
     """Get latest agent signals."""
     signals = AgentService.get_latest_signals(limit=limit)
-    return {"data": signals}
+    # Dump once in pydantic's JSON mode and return the response directly, skipping jsonable_encoder;
+    # timestamps stay naive local ISO strings, as jsonable_encoder produced them
+    return ORJSONResponse({"data": [s.model_dump(mode="json") for s in signals]})
+
+@router.get("/signals/{signal_id}/analyze")
+def analyze_signal_stream(signal_id: int):
+    """Stream an LLM analysis of a stored signal as NDJSON."""
+    signal = AgentService.get_signal(signal_id)
+    if not signal:
+        raise HTTPException(status_code=404, detail="Signal not found")
+    return StreamingResponse(
+        AgentLLM.analyze_signal_stream(signal),
+        media_type="application/x-ndjson"
+    )
@@ -1,4 +1,3 @@
-import asyncio
 from fastapi import APIRouter
 from pydantic import BaseModel
 from app.services.ai_service import AIService
@@ -8,7 +7,7 @@ router = APIRouter()
 class DiagnoseRequest(BaseModel):
     ticker: str
 
-from fastapi.responses import StreamingResponse
+from fastapi.responses import ORJSONResponse, StreamingResponse
 
 @router.get("/diagnose/{ticker}")
 async def diagnose_stock_stream(ticker: str):
@@ -19,9 +18,9 @@ async def diagnose_stock_stream(ticker: str):
 
 @router.post("/diagnose")
 async def diagnose_stock(request: DiagnoseRequest):
-    # Run synchronous LLM call in thread pool to avoid blocking event loop
-    report = await asyncio.to_thread(AIService.diagnose_stock, request.ticker)
-    return {
+    # Blocking fetches / LLM call run in worker threads inside the service
+    report = await AIService.diagnose_stock(request.ticker)
+    return ORJSONResponse({
         "ticker": request.ticker,
         "report": report
-    }
+    })
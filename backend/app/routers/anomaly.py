@@ -1,9 +1,15 @@
+from typing import Optional
 from fastapi import APIRouter, Query
+from fastapi.responses import ORJSONResponse
 from app.services.anomaly_service import AnomalyDetector
 
 router = APIRouter()
 
-@router.get("/scan")
-def scan_anomalies(filter: str = Query("all", description="Filter mode: all, watchlist, leaders")):
-    alerts = AnomalyDetector.scan_all(filter_mode=filter)
-    return {"data": alerts, "count": len(alerts), "filter": filter}
+@router.get("/scan", response_class=ORJSONResponse)
+async def scan_anomalies(
+    filter: str = Query("all", description="Filter mode: all, watchlist, leaders"),
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="Return only the newest N alerts"),
+):
+    alerts = await AnomalyDetector.scan_all_async(filter_mode=filter, limit=limit)
+    # Alerts are plain dicts of str/float/int: hand them to orjson directly
+    return ORJSONResponse({"data": alerts, "count": len(alerts), "filter": filter})
@@ -3,8 +3,9 @@ LLM 管理路由
 提供 LLM 提供商的 CRUD、模型切换、连接测试等 API
 """
 
+import asyncio
 import logging
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query
 from fastapi.responses import RedirectResponse
 from app.models.llm_config import (
     AddProviderRequest,
@@ -21,20 +22,23 @@ logger = logging.getLogger(__name__)
 router = APIRouter()
 
 
-@router.get("/providers")
-def list_providers():
+async def get_manager() -> LLMProviderManager:
+    """进程级单例管理器 (注入到各路由); async 依赖避免额外的线程池调度"""
+    return LLMProviderManager()
+
+
+@router.get("/providers", response_model=None)
+def list_providers(manager: LLMProviderManager = Depends(get_manager)):
     """获取所有已配置的提供商"""
-    manager = LLMProviderManager()
     providers = manager.list_providers()
     return {
-        "providers": [ProviderResponse.from_config(p) for p in providers],
+        "providers": ProviderResponse.rows_from_configs(providers),
     }
 
 
 @router.post("/providers")
-def add_provider(request: AddProviderRequest):
+def add_provider(request: AddProviderRequest, manager: LLMProviderManager = Depends(get_manager)):
     """添加新提供商"""
-    manager = LLMProviderManager()
     config = manager.add_provider(request)
     active = manager.get_active_model()
     return {
@@ -44,9 +48,8 @@ def add_provider(request: AddProviderRequest):
 
 
 @router.put("/providers/{provider_id}")
-def update_provider(provider_id: str, request: UpdateProviderRequest):
+def update_provider(provider_id: str, request: UpdateProviderRequest, manager: LLMProviderManager = Depends(get_manager)):
     """更新提供商配置"""
-    manager = LLMProviderManager()
     config = manager.update_provider(provider_id, request)
     if not config:
         raise HTTPException(status_code=404, detail="Provider not found")
@@ -54,9 +57,8 @@ def update_provider(provider_id: str, request: UpdateProviderRequest):
 
 
 @router.delete("/providers/{provider_id}")
-def remove_provider(provider_id: str):
+def remove_provider(provider_id: str, manager: LLMProviderManager = Depends(get_manager)):
     """删除提供商"""
-    manager = LLMProviderManager()
     success = manager.remove_provider(provider_id)
     if not success:
         raise HTTPException(status_code=404, detail="Provider not found")
@@ -68,17 +70,15 @@ def remove_provider(provider_id: str):
 
 
 @router.post("/providers/{provider_id}/test")
-def test_provider(provider_id: str):
+def test_provider(provider_id: str, manager: LLMProviderManager = Depends(get_manager)):
     """测试提供商连接"""
-    manager = LLMProviderManager()
     result = manager.test_connection(provider_id)
     return result
 
 
 @router.get("/active")
-def get_active_model():
+def get_active_model(manager: LLMProviderManager = Depends(get_manager)):
     """获取当前激活的模型"""
-    manager = LLMProviderManager()
     active = manager.get_active_model()
     if not active:
         return {"active_model": None, "provider": None}
@@ -91,9 +91,8 @@ def get_active_model():
 
 
 @router.put("/active")
-def set_active_model(request: SetActiveModelRequest):
+def set_active_model(request: SetActiveModelRequest, manager: LLMProviderManager = Depends(get_manager)):
     """切换激活模型"""
-    manager = LLMProviderManager()
     try:
         active = manager.set_active_model(request.provider_id, request.model_name)
         provider = manager.get_provider(active.provider_id)
@@ -105,18 +104,22 @@ def set_active_model(request: SetActiveModelRequest):
         raise HTTPException(status_code=400, detail=str(e))
 
 
+# 预设为静态数据, 导入时构建一次
+_PRESETS = {
+    key.value: {
+        "name": value["name"],
+        "auth_type": value["auth_type"].value if hasattr(value["auth_type"], "value") else value["auth_type"],
+        "base_url": value["base_url"],
+        "default_models": value["default_models"],
+    }
+    for key, value in PROVIDER_PRESETS.items()
+}
+
+
 @router.get("/presets")
 async def get_presets():
     """获取提供商预设配置"""
-    presets = {}
-    for key, value in PROVIDER_PRESETS.items():
-        presets[key.value] = {
-            "name": value["name"],
-            "auth_type": value["auth_type"].value if hasattr(value["auth_type"], "value") else value["auth_type"],
-            "base_url": value["base_url"],
-            "default_models": value["default_models"],
-        }
-    return {"presets": presets}
+    return {"presets": _PRESETS}
 
 
 # ---- Google OAuth2 ----
@@ -135,20 +138,20 @@ async def get_google_auth_url():
 async def google_oauth_callback(
     code: str = Query(...),
     state: str = Query(default=""),
+    manager: LLMProviderManager = Depends(get_manager),
 ):
     """
     Google OAuth 回调
     交换 code 获取 tokens，创建/更新提供商，重定向回前端
     """
     try:
-        # 1. 用 code 换取 tokens
-        tokens = GoogleOAuthService.exchange_code(code)
+        # 1. 用 code 换取 tokens (阻塞 HTTP, 放到线程中避免卡住事件循环)
+        tokens = await asyncio.to_thread(GoogleOAuthService.exchange_code, code)
 
         # 2. 获取用户信息
-        user_info = GoogleOAuthService.get_user_info(tokens["access_token"])
+        user_info = await asyncio.to_thread(GoogleOAuthService.get_user_info, tokens["access_token"])
 
         # 3. 添加/更新 Google Vertex 提供商
-        manager = LLMProviderManager()
         provider = manager.add_google_oauth_provider(
             tokens=tokens,
             user_info=user_info,
@@ -173,15 +176,14 @@ async def google_oauth_callback(
 
 
 @router.post("/google/logout")
-async def google_logout():
+async def google_logout(manager: LLMProviderManager = Depends(get_manager)):
     """断开 Google 连接，删除 Google Vertex 提供商"""
-    manager = LLMProviderManager()
-    providers = manager.list_providers()
-
-    for p in providers:
-        if p.type == ProviderType.GOOGLE_VERTEX:
-            manager.remove_provider(p.id)
-            return {"success": True, "message": "Google account disconnected"}
+    # 可能存在多个 Google 条目, 全部移除
+    google_providers = [p for p in manager.list_providers() if p.type == ProviderType.GOOGLE_VERTEX]
+    for p in google_providers:
+        manager.remove_provider(p.id)
 
+    if google_providers:
+        return {"success": True, "message": "Google account disconnected"}
     return {"success": False, "message": "No Google account connected"}
 
@@ -29,5 +29,5 @@ async def get_all_concepts():
     """
     Get all available concepts (cached).
     """
-    concepts = await asyncio.to_thread(LogicChainService.get_all_concepts)
+    concepts = await LogicChainService.get_all_concepts_async()
     return {"count": len(concepts), "concepts": concepts[:100]} # Limit to 100 for preview
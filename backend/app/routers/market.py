@@ -1,4 +1,6 @@
-from fastapi import APIRouter, HTTPException
+from datetime import datetime
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import ORJSONResponse
 from app.services.market_data import MarketDataService
 
 router = APIRouter()
@@ -9,24 +11,61 @@ import asyncio
 async def get_sector_heatmap():
     data = await asyncio.to_thread(MarketDataService.get_sector_heatmap)
     if not data:
-        return {"data": [], "message": "No data available or fetch failed"}
-    return {"data": data}
+        return ORJSONResponse({"data": [], "message": "No data available or fetch failed"})
+    return ORJSONResponse({"data": data})
 
 @router.get("/leaders")
 async def get_leader_stocks():
     data = await asyncio.to_thread(MarketDataService.get_leader_stocks)
     if not data:
-        return {"data": [], "message": "No data available or fetch failed"}
-    return {"data": data}
+        return ORJSONResponse({"data": [], "message": "No data available or fetch failed"})
+    return ORJSONResponse({"data": data})
 
 @router.get("/sentiment")
 async def get_market_sentiment():
     # Use the unified MarketSentimentService (Agent uses this too)
     from app.services.market_sentiment import MarketSentimentService
     data = await asyncio.to_thread(MarketSentimentService.get_market_sentiment)
-    return {"data": data}
+    return ORJSONResponse({"data": data})
 
 @router.get("/macro")
 async def get_macro_events():
     data = await asyncio.to_thread(MarketDataService.get_macro_events)
-    return {"data": data}
+    return ORJSONResponse({"data": data})
+
+@router.get("/macro/range")
+async def get_macro_events_range(
+    start: str = Query(..., description="YYYYMMDD"),
+    end: str = Query(..., description="YYYYMMDD"),
+):
+    try:
+        start_day = datetime.strptime(start, "%Y%m%d").date()
+        end_day = datetime.strptime(end, "%Y%m%d").date()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Dates must be YYYYMMDD")
+    if end_day < start_day or (end_day - start_day).days > 31:
+        raise HTTPException(status_code=400, detail="Range must be 0-31 days")
+    data = await MarketDataService.get_macro_events_range(start_day, end_day)
+    return ORJSONResponse({"data": data})
+
+@router.get("/dashboard")
+async def get_dashboard():
+    """Heatmap, leaders, sentiment and macro in one round trip, fetched concurrently."""
+    from app.services.market_sentiment import MarketSentimentService
+    heatmap, leaders, sentiment, macro = await asyncio.gather(
+        asyncio.to_thread(MarketDataService.get_sector_heatmap),
+        asyncio.to_thread(MarketDataService.get_leader_stocks),
+        asyncio.to_thread(MarketSentimentService.get_market_sentiment),
+        asyncio.to_thread(MarketDataService.get_macro_events),
+        return_exceptions=True,
+    )
+    # Keep partial results if one source fails
+    def _ok(value, default):
+        return default if isinstance(value, BaseException) else value
+
+    return ORJSONResponse({
+        "heatmap": _ok(heatmap, []),
+        "leaders": _ok(leaders, []),
+        "sentiment": _ok(sentiment, {}),
+        "macro": _ok(macro, []),
+    })
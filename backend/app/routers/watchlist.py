@@ -1,4 +1,5 @@
 from fastapi import APIRouter, Query
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel
 from typing import List, Optional
 from app.services.watchlist_service import WatchlistService
@@ -56,7 +57,7 @@ def update_tags(code: str, request: UpdateTagsRequest):
 
 import asyncio
 
-@router.get("/quotes")
+@router.get("/quotes", response_class=ORJSONResponse)
 def get_watchlist_quotes():
     """Get real-time quotes and portfolio summary for all watchlist stocks."""
     watchlist = WatchlistService.get_watchlist()
@@ -77,4 +78,4 @@ def get_watchlist_quotes():
 
     quotes = WatchlistQuoteService.get_quotes(watchlist)
     summary = WatchlistQuoteService.get_portfolio_summary(quotes)
-    return {"quotes": quotes, "summary": summary}
+    return ORJSONResponse({"quotes": quotes, "summary": summary})
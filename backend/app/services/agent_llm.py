@@ -1,6 +1,7 @@
 import logging
-import json
+import orjson
 from datetime import datetime
+from typing import List
 from app.models.signal import SignalRecord
 from app.services.llm_provider import LLMProviderManager
 
@@ -11,6 +12,41 @@ class AgentLLM:
     Handles LLM interactions for the Agent Brain.
     """
 
+    @staticmethod
+    def _build_messages(signal: SignalRecord) -> list:
+        """Prompt shared by the blocking and streaming analysis paths."""
+        prompt = f"""
+            角色：资深市场分析师 (理性、敏锐)
+            任务：分析监控系统生成的以下市场信号。
+
+            [信号信息]
+            - 类型: {signal.type}
+            - 级别: {signal.level.upper()}
+            - 消息: {signal.message}
+            - 时间: {signal.timestamp}
+            - 元数据: {signal.metadata_json}
+
+            [数据字典]
+            - limit_up_count: 涨停家数
+            - limit_down_count: 跌停家数 !!注意区分!!
+            - fried_board_count: 炸板家数
+            - up_count: 上涨家数
+            - down_count: 下跌家数
+            - mood_index: 情绪指数
+
+            [指令]
+            1. **重要性**: 解释为什么这个信号值得关注。请准确引用数据（如涨跌停数量）。
+            2. **风险提示**: 潜在的市场风险是什么？
+            3. **操作建议**: 交易者应该采取什么行动？(具体点：减仓、对冲、观望或寻找机会)
+            4. **格式**: 使用 Markdown 格式。
+            5. **语言**: 必须使用中文回答。
+            6. 字数控制在 200 字以内。
+            """
+        return [
+            {"role": "system", "content": "You are NEXUS, a rational AI trading assistant. Always answer in Chinese."},
+            {"role": "user", "content": prompt}
+        ]
+
     @staticmethod
     def analyze_signal(signal: SignalRecord) -> str:
         """
@@ -24,17 +60,51 @@ class AgentLLM:
             if not client or not model_name:
                 return "LLM not configured. Cannot perform deep analysis."
 
-            # Construct Prompt
+            response = client.chat.completions.create(
+                model=model_name,
+                messages=AgentLLM._build_messages(signal),
+                timeout=60,
+            )
+
+            content = response.choices[0].message.content
+            return content
+
+        except Exception as e:
+            logger.error(f"AgentLLM analysis error: {e}")
+            return f"Analysis failed: {str(e)}"
+
+    @staticmethod
+    def analyze_signals_batch(signals: List[SignalRecord]) -> List[str]:
+        """
+        Analyze several signals with a single LLM call.
+        Returns one markdown string per input signal (same order).
+        Falls back to per-signal calls if the batched reply cannot be parsed.
+        """
+        if len(signals) <= 1:
+            return [AgentLLM.analyze_signal(s) for s in signals]
+
+        try:
+            manager = LLMProviderManager()
+            client, model_name = manager.get_client()
+
+            if not client or not model_name:
+                return ["LLM not configured. Cannot perform deep analysis."] * len(signals)
+
+            blocks = "\n".join(
+                f"""
+            [信号 {i}]
+            - 类型: {s.type}
+            - 级别: {s.level.upper()}
+            - 消息: {s.message}
+            - 时间: {s.timestamp}
+            - 元数据: {s.metadata_json}"""
+                for i, s in enumerate(signals, 1)
+            )
+
             prompt = f"""
             角色：资深市场分析师 (理性、敏锐)
-            任务：分析监控系统生成的以下市场信号。
-
-            [信号信息]
-            - 类型: {signal.type}
-            - 级别: {signal.level.upper()}
-            - 消息: {signal.message}
-            - 时间: {signal.timestamp}
-            - 元数据: {signal.metadata_json}
+            任务：分别分析监控系统同时生成的以下 {len(signals)} 条市场信号。
+            {blocks}
 
             [数据字典]
             - limit_up_count: 涨停家数
@@ -45,12 +115,14 @@ class AgentLLM:
             - mood_index: 情绪指数
 
             [指令]
+            对每条信号:
             1. **重要性**: 解释为什么这个信号值得关注。请准确引用数据（如涨跌停数量）。
             2. **风险提示**: 潜在的市场风险是什么？
             3. **操作建议**: 交易者应该采取什么行动？(具体点：减仓、对冲、观望或寻找机会)
-            4. **格式**: 使用 Markdown 格式。
-            5. **语言**: 必须使用中文回答。
-            6. 字数控制在 200 字以内。
+            4. 使用 Markdown 格式, 中文回答, 每条 200 字以内。
+
+            [输出格式]
+            只输出 JSON: {{"analyses": [{{"id": 1, "markdown": "..."}}, ...]}}, id 对应信号编号。
             """
 
             response = client.chat.completions.create(
@@ -59,12 +131,62 @@ class AgentLLM:
                     {"role": "system", "content": "You are NEXUS, a rational AI trading assistant. Always answer in Chinese."},
                     {"role": "user", "content": prompt}
                 ],
+                response_format={"type": "json_object"},
+                timeout=90,
+            )
+
+            payload = orjson.loads(response.choices[0].message.content)
+            # Match replies to signals by id; ids outside 1..N (invented) are ignored
+            by_id = {}
+            for a in payload.get("analyses", []):
+                try:
+                    i = int(a["id"])
+                    markdown = a["markdown"]
+                except (KeyError, TypeError, ValueError):
+                    continue
+                if 1 <= i <= len(signals) and isinstance(markdown, str) and markdown.strip():
+                    by_id[i] = markdown
+
+            missing = len(signals) - len(by_id)
+            if missing:
+                logger.warning(f"AgentLLM batch reply missing {missing} signal(s), analyzing those individually")
+            # Signals without a matching reply go to the per-signal call
+            return [
+                by_id[i] if i in by_id else AgentLLM.analyze_signal(s)
+                for i, s in enumerate(signals, 1)
+            ]
+
+        except Exception as e:
+            logger.error(f"AgentLLM batch analysis error: {e}")
+
+        return [AgentLLM.analyze_signal(s) for s in signals]
+
+    @staticmethod
+    def analyze_signal_stream(signal: SignalRecord):
+        """
+        Streaming variant of analyze_signal (yields NDJSON chunks as tokens arrive).
+        """
+        try:
+            manager = LLMProviderManager()
+            client, model_name = manager.get_client()
+
+            if not client or not model_name:
+                yield orjson.dumps({"type": "error", "content": "LLM not configured. Cannot perform deep analysis."}) + b"\n"
+                return
+
+            stream = client.chat.completions.create(
+                model=model_name,
+                messages=AgentLLM._build_messages(signal),
+                stream=True,
                 timeout=60,
             )
 
-            content = response.choices[0].message.content
-            return content
+            for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield orjson.dumps({"type": "chunk", "content": chunk.choices[0].delta.content}) + b"\n"
+
+            yield orjson.dumps({"type": "done", "content": ""}) + b"\n"
 
         except Exception as e:
-            logger.error(f"AgentLLM analysis error: {e}")
-            return f"Analysis failed: {str(e)}"
+            logger.error(f"AgentLLM stream error: {e}")
+            yield orjson.dumps({"type": "error", "content": f"Analysis failed: {str(e)}"}) + b"\n"
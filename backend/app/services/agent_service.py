@@ -1,9 +1,9 @@
 import asyncio
 import logging
-import json
+import orjson
 from datetime import datetime, timedelta
-from typing import List, Optional
-from sqlmodel import Session, select, desc
+from typing import List, Optional, Set, Tuple
+from sqlmodel import Session, select, desc, func
 
 from app.db.database import engine
 from app.models.sentiment import SentimentRecord
@@ -16,6 +16,25 @@ import asyncio
 
 logger = logging.getLogger(__name__)
 
+# Rule table: (predicate, type, level, message), each taking (sentiment, anomaly_counts by type).
+# Evaluated in order once per tick.
+RULES = [
+    # Rule A: Overheating
+    (lambda s, a: s.mood_index > 80, "sentiment_spike", "warning",
+     lambda s, a: f"Market is Overheating! Mood Index: {s.mood_index:.1f}"),
+    # Rule B: High Risk (Fried Board)
+    (lambda s, a: s.fried_rate > 30, "risk_alert", "critical",
+     lambda s, a: f"High Risk Alert! Fried Board Rate: {s.fried_rate:.1f}%"),
+    # Rule C: Recovery (Trend reversal). Need previous record? For now simple check
+    (lambda s, a: s.trend == "up" and s.mood_index < 50, "recovery_sign", "info",
+     lambda s, a: "Market is recovering. Trend is Up."),
+    # Rule D: Anomaly Burst (last 5 mins)
+    (lambda s, a: a.get("rocket", 0) > 5, "anomaly_burst", "info",
+     lambda s, a: f"Rocket Burst! {a.get('rocket', 0)} stocks skyrocketing in last 5 mins."),
+    (lambda s, a: a.get("dive", 0) > 5, "anomaly_burst", "warning",
+     lambda s, a: f"Dive Burst! {a.get('dive', 0)} stocks diving in last 5 mins."),
+]
+
 class AgentService:
     """
     The Brain of NEXUS Trader.
@@ -23,12 +42,17 @@ class AgentService:
     """
     _running = False
     _task = None
+    _wake: Optional[asyncio.Event] = None
+    _event_loop: Optional[asyncio.AbstractEventLoop] = None
+    _enrich_tasks: Set[asyncio.Task] = set()  # strong refs so background LLM tasks aren't GC'd
 
     @classmethod
     def start(cls):
         if cls._running:
             return
         cls._running = True
+        cls._wake = asyncio.Event()
+        cls._event_loop = asyncio.get_running_loop()
         cls._task = asyncio.create_task(cls._loop())
         logger.info("Agent Brain started 🧠")
 
@@ -50,100 +74,135 @@ class AgentService:
             except Exception as e:
                 logger.error(f"Agent analysis error: {e}")
             
-            # Sleep for 60 seconds (MVP)
-            await asyncio.sleep(60)
+            # Wait for producers to report fresh data; 60s timeout as a safety net
+            try:
+                await asyncio.wait_for(cls._wake.wait(), timeout=60)
+            except asyncio.TimeoutError:
+                pass
+            cls._wake.clear()
+
+    @classmethod
+    def notify(cls):
+        """
+        Wake the loop early because new sentiment/anomaly records were committed.
+        Safe to call from worker threads (producers run under asyncio.to_thread).
+        """
+        if not cls._running or cls._wake is None or cls._event_loop is None:
+            return
+        try:
+            cls._event_loop.call_soon_threadsafe(cls._wake.set)
+        except RuntimeError:
+            pass  # Event loop already closed
 
     @classmethod
     async def analyze(cls):
         """Analyze current market state and generate signals."""
         logger.info("Agent analyzing market state...")
-        
-        with Session(engine) as session:
-            # 1. Fetch latest Context
-            sentiment = session.exec(
-                select(SentimentRecord).order_by(desc(SentimentRecord.timestamp)).limit(1)
-            ).first()
-
-            if not sentiment:
-                logger.warning("Agent: No sentiment data available yet.")
-                return
-
-            # 2. Rule Engine
-            # Rule A: Overheating
-            if sentiment.mood_index > 80:
-                await cls._create_signal(session, "sentiment_spike", "warning", 
-                                   f"Market is Overheating! Mood Index: {sentiment.mood_index:.1f}")
-            
-            # Rule B: High Risk (Fried Board)
-            if sentiment.fried_rate > 30:
-                await cls._create_signal(session, "risk_alert", "critical", 
-                                   f"High Risk Alert! Fried Board Rate: {sentiment.fried_rate:.1f}%")
-
-            # Rule C: Recovery (Trend reversal)
-            # Need previous record? For now simple check
-            if sentiment.trend == "up" and sentiment.mood_index < 50:
-                 await cls._create_signal(session, "recovery_sign", "info", 
-                                   f"Market is recovering. Trend is Up.")
-
-            # Rule D: Anomaly Burst
-            # Count anomalies in last 5 mins
-            five_mins_ago = datetime.now() - timedelta(minutes=5)
-            recent_anomalies = session.exec(
-                select(AnomalyRecord).where(AnomalyRecord.timestamp >= five_mins_ago)
-            ).all()
 
-            rockets = [a for a in recent_anomalies if a.type == "rocket"]
-            dives = [a for a in recent_anomalies if a.type == "dive"]
+        # DB reads, rule evaluation and inserts are blocking; one session/thread hop per tick
+        created = await asyncio.to_thread(cls._run_tick)
 
-            if len(rockets) > 5:
-                 await cls._create_signal(session, "anomaly_burst", "info", 
-                                   f"Rocket Burst! {len(rockets)} stocks skyrocketing in last 5 mins.")
-            
-            if len(dives) > 5:
-                 await cls._create_signal(session, "anomaly_burst", "warning", 
-                                   f"Dive Burst! {len(dives)} stocks diving in last 5 mins.")
+        for signal in created:
+            logger.info(f"Generated Signal: {signal.message}")
+            # Broadcast via NotificationService (First Alert)
+            await NotificationService.broadcast(signal.model_dump())
+
+        # Deep analysis for Critical/Warning signals, one LLM call per tick.
+        # Runs in the background so the next tick isn't held up by LLM latency.
+        pending = [s for s in created if s and s.level in ["critical", "warning"]]
+        if pending:
+            task = asyncio.create_task(cls._analyze_signals(pending))
+            cls._enrich_tasks.add(task)
+            task.add_done_callback(cls._enrich_tasks.discard)
 
     @classmethod
-    async def _create_signal(cls, session: Session, type: str, level: str, message: str, meta: dict = {}):
-        """Helper to create and deduplicate signals."""
-        # Simple dedupe: Check if same signal type & message exists in last 10 mins
+    def _run_tick(cls) -> List[SignalRecord]:
+        """Evaluate rules and persist new signals in a single session, committed once."""
+        # All columns are set client-side; flush assigns ids, so no refresh SELECT after commit
+        with Session(engine, expire_on_commit=False) as session:
+            created = [
+                cls._create_signal(session, type, level, message)
+                for type, level, message in cls._evaluate_rules(session)
+            ]
+            if created:
+                session.flush()
+                session.commit()
+            return created
+
+    @classmethod
+    def _evaluate_rules(cls, session: Session) -> List[Tuple[str, str, str]]:
+        """
+        Run the rule engine against the latest context.
+        Returns (type, level, message) per fired rule, minus signals already raised in the last 10 mins.
+        """
+        # 1. Fetch latest Context
+        sentiment = session.exec(
+            select(SentimentRecord).order_by(desc(SentimentRecord.timestamp)).limit(1)
+        ).first()
+
+        if not sentiment:
+            logger.warning("Agent: No sentiment data available yet.")
+            return []
+
+        # 2. Context for the rules: anomaly counts by type in the last 5 mins
+        five_mins_ago = datetime.now() - timedelta(minutes=5)
+        anomaly_counts = dict(session.exec(
+            select(AnomalyRecord.type, func.count())
+            .where(AnomalyRecord.timestamp >= five_mins_ago)
+            .group_by(AnomalyRecord.type)
+        ).all())
+
+        # 3. Rule Engine
+        candidates = [
+            (type, level, message(sentiment, anomaly_counts))
+            for predicate, type, level, message in RULES
+            if predicate(sentiment, anomaly_counts)
+        ]
+
+        if not candidates:
+            return []
+
+        # Simple dedupe: skip if same signal type & message exists in last 10 mins (one query per tick)
         ten_mins_ago = datetime.now() - timedelta(minutes=10)
-        existing = session.exec(
-            select(SignalRecord)
-            .where(SignalRecord.type == type)
-            .where(SignalRecord.message == message)
+        recent = set(session.exec(
+            select(SignalRecord.type, SignalRecord.message)
             .where(SignalRecord.timestamp >= ten_mins_ago)
-        ).first()
+        ).all())
 
-        if existing:
-            return # Skip duplicate
+        return [c for c in candidates if (c[0], c[2]) not in recent]
 
+    @classmethod
+    def _create_signal(cls, session: Session, type: str, level: str, message: str, meta: Optional[dict] = None) -> SignalRecord:
+        """Stage a signal on the tick's session (dedupe happens in _evaluate_rules)."""
         signal = SignalRecord(
             type=type,
             level=level,
             message=message,
-            metadata_json=json.dumps(meta)
+            metadata_json=orjson.dumps(meta).decode() if meta else "{}"
         )
         session.add(signal)
-        session.commit()
-        session.refresh(signal)
-        logger.info(f"Generated Signal: {signal.message}")
-        
-        # Broadcast via NotificationService (First Alert)
-        await NotificationService.broadcast(signal.model_dump())
-
-        # Trigger LLM Analysis for Critical/Warning signals
-        if level in ["critical", "warning"]:
-            try:
-                # Run in thread to avoid blocking loop
-                analysis = await asyncio.to_thread(AgentLLM.analyze_signal, signal)
+        return signal
+
+    @classmethod
+    async def _analyze_signals(cls, signals: List[SignalRecord]):
+        """Attach LLM analysis to freshly created signals (batched)."""
+        ids = [s.id for s in signals]
+        try:
+            # Run in thread to avoid blocking loop
+            analyses = await asyncio.to_thread(AgentLLM.analyze_signals_batch, signals)
+            await asyncio.to_thread(cls._save_analyses, signals, analyses)
+            logger.info(f"Signals analyzed by LLM: {ids}")
+        except Exception as e:
+            logger.error(f"Failed to analyze signals: {e}")
+
+    @classmethod
+    def _save_analyses(cls, signals: List[SignalRecord], analyses: List[str]):
+        with Session(engine) as session:
+            for signal, analysis in zip(signals, analyses):
                 if analysis:
                     signal.analysis_content = analysis
                     session.add(signal)
-                    session.commit()
-                    logger.info(f"Signal analyzed by LLM: {signal.id}")
-            except Exception as e:
-                logger.error(f"Failed to analyze signal: {e}")
+            session.commit()
 
     @classmethod
     def get_latest_signals(cls, limit: int = 10) -> List[SignalRecord]:
@@ -151,3 +210,8 @@ class AgentService:
             return session.exec(
                 select(SignalRecord).order_by(desc(SignalRecord.timestamp)).limit(limit)
             ).all()
+
+    @classmethod
+    def get_signal(cls, signal_id: int) -> Optional[SignalRecord]:
+        with Session(engine) as session:
+            return session.get(SignalRecord, signal_id)
@@ -1,12 +1,18 @@
 import os
+import orjson
+import asyncio
+import hashlib
 import logging
+import time
 import requests
+from concurrent.futures import ThreadPoolExecutor
 from openai import OpenAI
-from typing import Optional
+from typing import Dict, Optional, Tuple
 
 from app.services.llm_provider import LLMProviderManager
 from app.services.stock_search import get_stock_history_sina, get_stock_history_df
 from app.services.stock_analysis import StockAnalysisService
+from app.utils.cache import SimpleCache
 import pandas as pd
 
 logger = logging.getLogger(__name__)
@@ -20,72 +26,114 @@ _sina_session.headers.update({
 })
 
 
+# Stock names barely change; cache them so repeated diagnoses skip the quote round-trip
+_NAME_TTL = 3600
+_name_cache: Dict[str, Tuple[str, float]] = {}
+
+
 def _quick_stock_name(code: str) -> str:
     """Get stock name from Sina quote API (fast, no akshare)."""
     code = code.strip().zfill(6)
+    cached = _name_cache.get(code)
+    if cached and time.time() - cached[1] < _NAME_TTL:
+        return cached[0]
+
     prefix = "sh" if code.startswith(("60", "68", "11")) else "sz"
     try:
-        url = f"https://hq.sinajs.cn/list={prefix}{code}"
-        r = _sina_session.get(url, timeout=5)
-        if r.status_code == 200 and r.text.strip():
-            # Format: var hq_str_sh000001="平安银行,11.07,...";
-            parts = r.text.split('"')
+        r = _sina_session.get(f"https://hq.sinajs.cn/list={prefix}{code}", timeout=5)
+        if r.status_code == 200:
+            # Format: var hq_str_sh000001="平安银行,11.07,..."; (GBK body)
+            # Decode only the name field, not the whole quote payload
+            parts = r.content.split(b'"', 2)
             if len(parts) >= 2:
-                fields = parts[1].split(",")
-                if fields and fields[0]:
-                    return fields[0]
+                name = parts[1].split(b",", 1)[0].decode("gbk", "ignore")
+                if name:
+                    _name_cache[code] = (name, time.time())
+                    return name
     except Exception:
         pass
     return code
 
 
+# Worker threads for the independent pre-LLM fetches of the streaming endpoint
+_fetch_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="diagnose-fetch")
+
+# Finished diagnosis reports, keyed by model + prompt (the prompt embeds the data snapshot)
+_DIAGNOSE_CACHE_TTL = 300
+
+
+# Streamed LLM text is coalesced into few frames; only the content value needs JSON-encoding
+_CHUNK_FRAME_PREFIX = b'{"type":"chunk","content":'
+_CHUNK_FRAME_SUFFIX = b'}\n'
+_CHUNK_FLUSH_EVERY = 8
+
+
+def _chunk_frame(content: str) -> bytes:
+    return _CHUNK_FRAME_PREFIX + orjson.dumps(content) + _CHUNK_FRAME_SUFFIX
+
+
+def _diagnose_cache_key(model_name: str, prompt: str) -> str:
+    digest = hashlib.blake2b(f"{model_name}|{prompt}".encode(), digest_size=16).hexdigest()
+    return f"diagnose:{digest}"
+
+
+_TABLE_HEADER = ("| 日期 | 收盘 | MA5 | MA20 | RSI(6) | MACD | K/D/J | 成交量 |\n"
+                 "|---|---|---|---|---|---|---|---|")
+_TABLE_COLUMNS = ['close', 'ma5', 'ma20', 'rsi_6', 'macd', 'k', 'd', 'j', 'volume']
+
+
+def _format_indicator_table(recent_df: pd.DataFrame) -> str:
+    """Render the recent price/indicator rows as the Markdown table used in the prompt."""
+    values = recent_df.reindex(columns=_TABLE_COLUMNS).fillna(0)
+    day = recent_df['day'].astype(str) if 'day' in recent_df.columns else pd.Series('', index=recent_df.index)
+    fmt = lambda col, spec: values[col].map(spec.format)
+    rows = (
+        "| " + day
+        + " | " + fmt('close', '{:.2f}')
+        + " | " + fmt('ma5', '{:.2f}')
+        + " | " + fmt('ma20', '{:.2f}')
+        + " | " + fmt('rsi_6', '{:.1f}')
+        + " | " + fmt('macd', '{:.3f}')
+        + " | " + fmt('k', '{:.1f}') + "/" + fmt('d', '{:.1f}') + "/" + fmt('j', '{:.1f}')
+        + " | " + (values['volume'] / 10000).map('{:.0f}万'.format)
+        + " |"
+    )
+    return _TABLE_HEADER + "".join("\n" + r for r in rows)
+
+
 class AIService:
     @staticmethod
     def stream_diagnose_stock(ticker: str):
         """
         Stream the stock diagnosis report.
         Yields:
-             str: JSON string with "type" and "content"
+             bytes: NDJSON frame with "type" and "content"
         """
-        import json
-        
         try:
-            yield json.dumps({"type": "status", "content": f"正在分析 {ticker}..."}) + "\n"
+            yield orjson.dumps({"type": "status", "content": f"正在分析 {ticker}..."}) + b"\n"
+
+            # Independent HTTP round-trips: start them all now, report progress as they land
+            name_future = _fetch_pool.submit(_quick_stock_name, ticker)
+            history_future = _fetch_pool.submit(get_stock_history_df, ticker, 80)
+            fundamentals_future = _fetch_pool.submit(StockAnalysisService.get_fundamentals, ticker)
+            news_future = _fetch_pool.submit(StockAnalysisService.get_stock_news, ticker)
             
             # 1. 获取股票名称
-            name = _quick_stock_name(ticker)
-            yield json.dumps({"type": "status", "content": f"识别到股票：{name}，正在拉取行情..."}) + "\n"
+            name = name_future.result()
+            yield orjson.dumps({"type": "status", "content": f"识别到股票：{name}，正在拉取行情..."}) + b"\n"
 
             # 2. 获取并计算技术指标
-            df = get_stock_history_df(ticker, days=80) 
+            df = history_future.result()
             if not df.empty:
                 df = StockAnalysisService.calculate_technicals(df)
-                recent_df = df.tail(30).copy()
-                
-                # Format data table
-                lines = ["| 日期 | 收盘 | MA5 | MA20 | RSI(6) | MACD | K/D/J | 成交量 |",
-                         "|---|---|---|---|---|---|---|---|"]
-                
-                for _, row in recent_df.iterrows():
-                    date = row.get('day', '')
-                    close = f"{row.get('close', 0):.2f}"
-                    ma5 = f"{row.get('ma5', 0):.2f}"
-                    ma20 = f"{row.get('ma20', 0):.2f}"
-                    rsi = f"{row.get('rsi_6', 0):.1f}"
-                    macd = f"{row.get('macd', 0):.3f}"
-                    kdj = f"{row.get('k', 0):.1f}/{row.get('d', 0):.1f}/{row.get('j', 0):.1f}"
-                    vol = f"{row.get('volume', 0)/10000:.0f}万"
-                    
-                    lines.append(f"| {date} | {close} | {ma5} | {ma20} | {rsi} | {macd} | {kdj} | {vol} |")
-                
-                market_data_str = "\n".join(lines)
+                market_data_str = _format_indicator_table(df.tail(30))
             else:
                 market_data_str = "无法获取行情数据"
 
-            yield json.dumps({"type": "status", "content": "正在获取基本面与新闻..."}) + "\n"
+            yield orjson.dumps({"type": "status", "content": "正在获取基本面与新闻..."}) + b"\n"
 
             # 3. 获取基本面
-            fundamentals = StockAnalysisService.get_fundamentals(ticker)
+            fundamentals = fundamentals_future.result()
             fund_str = "无法获取基本面数据"
             if fundamentals:
                 pe = f"{fundamentals.get('pe_ttm', 'N/A')}"
@@ -96,7 +144,7 @@ class AIService:
                 fund_str = f"- 市盈率(TTM): {pe}\n- 市净率: {pb}\n- 总市值: {mkt_val}"
 
             # 4. 获取新闻
-            news = StockAnalysisService.get_stock_news(ticker)
+            news = news_future.result()
             news_str = "无近期相关新闻"
             if news:
                 news_lines = []
@@ -134,13 +182,20 @@ class AIService:
                - 说明理由（支撑位/压力位）。
             """
             
-            yield json.dumps({"type": "status", "content": "数据整合完毕，开始 AI 分析..."}) + "\n"
+            yield orjson.dumps({"type": "status", "content": "数据整合完毕，开始 AI 分析..."}) + b"\n"
 
             # 6. 调用 LLM
             manager = LLMProviderManager()
             client, model_name = manager.get_client()
 
             if client and model_name:
+                cache_key = _diagnose_cache_key(model_name, prompt)
+                cached = SimpleCache.get(cache_key)
+                if cached is not None:
+                    yield _chunk_frame(cached)
+                    yield orjson.dumps({"type": "done", "content": ""}) + b"\n"
+                    return
+
                 stream = client.chat.completions.create(
                     model=model_name,
                     messages=[
@@ -151,21 +206,31 @@ class AIService:
                     stream=True
                 )
                 
+                parts = []
+                buf = []
                 for chunk in stream:
                     if hasattr(chunk, 'choices') and chunk.choices and chunk.choices[0].delta.content:
                         c = chunk.choices[0].delta.content
-                        yield json.dumps({"type": "chunk", "content": c}) + "\n"
+                        parts.append(c)
+                        buf.append(c)
+                        if len(buf) >= _CHUNK_FLUSH_EVERY or '\n' in c:
+                            yield _chunk_frame(''.join(buf))
+                            buf.clear()
+                if buf:
+                    yield _chunk_frame(''.join(buf))
                 
-                yield json.dumps({"type": "done", "content": ""}) + "\n"
+                if parts:
+                    SimpleCache.set(cache_key, "".join(parts), ttl=_DIAGNOSE_CACHE_TTL)
+                yield orjson.dumps({"type": "done", "content": ""}) + b"\n"
             else:
-                yield json.dumps({"type": "error", "content": "未配置 LLM，无法生成报告。"}) + "\n"
+                yield orjson.dumps({"type": "error", "content": "未配置 LLM，无法生成报告。"}) + b"\n"
 
         except Exception as e:
             logger.error(f"Diagnose error for {ticker}: {e}")
-            yield json.dumps({"type": "error", "content": str(e)}) + "\n"
+            yield orjson.dumps({"type": "error", "content": str(e)}) + b"\n"
 
     @staticmethod
-    def diagnose_stock(ticker: str) -> str:
+    async def diagnose_stock(ticker: str) -> str:
         """
         生成个股诊断报告
         1. 获取基础行情 (Sina)
@@ -175,40 +240,24 @@ class AIService:
         5. 调用 LLM 生成分析报告
         """
         try:
-            # 1. 获取股票名称
-            name = _quick_stock_name(ticker)
+            # 1-4. 名称 / 行情 / 基本面 / 新闻 互不依赖, 并发拉取
+            name, df, fundamentals, news = await asyncio.gather(
+                asyncio.to_thread(_quick_stock_name, ticker),
+                asyncio.to_thread(get_stock_history_df, ticker, 80), # Fetch more for indicators
+                asyncio.to_thread(StockAnalysisService.get_fundamentals, ticker),
+                asyncio.to_thread(StockAnalysisService.get_stock_news, ticker),
+            )
 
-            # 2. 获取并计算技术指标
-            df = get_stock_history_df(ticker, days=80) # Fetch more for indicators
+            # 2. 计算技术指标
             if not df.empty:
                 df = StockAnalysisService.calculate_technicals(df)
                 # Keep last 30 days for prompt
-                recent_df = df.tail(30).copy()
-                
-                # Format data for prompt
                 # Columns: day, open, close, high, low, volume, ma5, ma10, ma20, macd, signal, hist, rsi_6, k, d, j
-                # Create a markdown table
-                lines = ["| 日期 | 收盘 | MA5 | MA20 | RSI(6) | MACD | K/D/J | 成交量 |",
-                         "|---|---|---|---|---|---|---|---|"]
-                
-                for _, row in recent_df.iterrows():
-                    date = row.get('day', '')
-                    close = f"{row.get('close', 0):.2f}"
-                    ma5 = f"{row.get('ma5', 0):.2f}"
-                    ma20 = f"{row.get('ma20', 0):.2f}"
-                    rsi = f"{row.get('rsi_6', 0):.1f}"
-                    macd = f"{row.get('macd', 0):.3f}"
-                    kdj = f"{row.get('k', 0):.1f}/{row.get('d', 0):.1f}/{row.get('j', 0):.1f}"
-                    vol = f"{row.get('volume', 0)/10000:.0f}万"
-                    
-                    lines.append(f"| {date} | {close} | {ma5} | {ma20} | {rsi} | {macd} | {kdj} | {vol} |")
-                
-                market_data_str = "\n".join(lines)
+                market_data_str = _format_indicator_table(df.tail(30))
             else:
                 market_data_str = "无法获取行情数据"
 
-            # 3. 获取基本面
-            fundamentals = StockAnalysisService.get_fundamentals(ticker)
+            # 3. 基本面
             fund_str = "无法获取基本面数据"
             if fundamentals:
                 pe = f"{fundamentals.get('pe_ttm', 'N/A')}"
@@ -218,8 +267,7 @@ class AIService:
                    mkt_val = f"{mkt_val/100000000:.2f}亿"
                 fund_str = f"- 市盈率(TTM): {pe}\n- 市净率: {pb}\n- 总市值: {mkt_val}"
 
-            # 4. 获取新闻
-            news = StockAnalysisService.get_stock_news(ticker)
+            # 4. 新闻
             news_str = "无近期相关新闻"
             if news:
                 news_lines = []
@@ -257,12 +305,17 @@ class AIService:
                - 说明理由（支撑位/压力位）。
             """
 
-            # 6. 调用 LLM
-            manager = LLMProviderManager()
-            client, model_name = manager.get_client()
+            # 6. 调用 LLM (client setup may refresh OAuth tokens; keep blocking work off the loop)
+            client, model_name = await asyncio.to_thread(lambda: LLMProviderManager().get_client())
 
             if client and model_name:
-                response = client.chat.completions.create(
+                cache_key = _diagnose_cache_key(model_name, prompt)
+                cached = SimpleCache.get(cache_key)
+                if cached is not None:
+                    return cached
+
+                response = await asyncio.to_thread(
+                    client.chat.completions.create,
                     model=model_name,
                     messages=[
                         {"role": "system", "content": "You are a professional financial analyst. Output in Markdown."},
@@ -270,7 +323,10 @@ class AIService:
                     ],
                     timeout=120,
                 )
-                return response.choices[0].message.content
+                content = response.choices[0].message.content
+                if content:
+                    SimpleCache.set(cache_key, content, ttl=_DIAGNOSE_CACHE_TTL)
+                return content
             else:
                 return f"""
 # 📉 {name} ({ticker}) AI 诊断报告 (Mock)
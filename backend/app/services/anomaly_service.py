@@ -1,13 +1,19 @@
+import asyncio
+import heapq
 import logging
 import time
+from operator import itemgetter
 from datetime import datetime
 from typing import List, Dict, Any, Optional
-import akshare as ak
-from tenacity import retry, stop_after_attempt, wait_fixed
-from sqlmodel import Session, select
+import numpy as np
+import pandas as pd
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlmodel import Session
 
 from app.db.database import engine
 from app.models.anomaly import AnomalyRecord
+from app.services.market_data import MarketDataService
+from app.utils.cache import ttl_cache, TTL_ANOMALIES, TTL_ANOMALY_SCAN
 
 logger = logging.getLogger(__name__)
 
@@ -53,6 +59,30 @@ SEVERITY_MAP = {
     "竞价下跌": "low",
 }
 
+# Alert message per internal type (bound str.format, looked up once per row)
+MESSAGE_TEMPLATES = {
+    "rocket": "{emoji} {ct}！{name}({code}) 涨幅 {pct:+.1f}%，现价 ¥{price}".format,
+    "dive": "{emoji} {ct}！{name}({code}) 跌幅 {pct:+.1f}%，现价 ¥{price}".format,
+    "big_order_buy": "{emoji} {ct}！{name}({code}) 成交额 {amount_wan:.0f}万，涨幅 {pct:+.1f}%".format,
+    "big_order_sell": "{emoji} {ct}！{name}({code}) 成交额 {amount_wan:.0f}万，跌幅 {pct:+.1f}%".format,
+}
+DEFAULT_MESSAGE_TEMPLATE = "⚡ {ct}！{name}({code})".format
+
+
+def _change_attr(change_type: str) -> tuple:
+    internal_type = TYPE_MAP.get(change_type, "rocket")
+    return (
+        internal_type,
+        SEVERITY_MAP.get(change_type, "low"),
+        EMOJI_MAP.get(internal_type, "⚡"),
+        MESSAGE_TEMPLATES.get(internal_type, DEFAULT_MESSAGE_TEMPLATE),
+    )
+
+
+# change_type -> (internal_type, severity, emoji, message template): one lookup per row
+CHANGE_ATTR = {ct: _change_attr(ct) for ct in set(TYPE_MAP) | set(SEVERITY_MAP)}
+DEFAULT_CHANGE_ATTR = _change_attr("")
+
 
 class AnomalyDetector:
     """
@@ -60,134 +90,127 @@ class AnomalyDetector:
     This is far more reliable than manually computing deltas from full market snapshots.
     """
 
+    _provider = MarketDataService._provider  # one provider instance (and provider cache) process-wide
+
     @staticmethod
-    @retry(stop=stop_after_attempt(2), wait=wait_fixed(1))
+    @ttl_cache(ttl=TTL_ANOMALIES, serve_stale=False)
     def _fetch_changes():
-        """Fetch EastMoney real-time anomaly data."""
-        return ak.stock_changes_em()
+        """
+        Fetch EastMoney real-time anomaly data (provider retries transient errors).
+        Cached briefly so concurrent scans (all / watchlist / leaders) share one upstream call.
+        Never falls back to an old frame: scan_all stamps rows with today's date, so a stale
+        frame would be saved as new events. Errors propagate to scan_all's error path.
+        """
+        return AnomalyDetector._provider.get_market_anomalies_df()
 
     @staticmethod
-    def _parse_info(info_str: str, change_type: str) -> Dict[str, Any]:
+    def _parse_info_frame(info: pd.Series) -> pd.DataFrame:
         """
-        Parse the '相关信息' field.
+        Parse the whole '相关信息' column at once.
         Format varies by type, typically: volume,price,change_pct,amount
+        Short rows are price,change_pct; unparsable fields become 0.
         """
-        extra = {}
-        try:
-            parts = info_str.split(",")
-            if len(parts) >= 4:
-                extra["volume"] = int(float(parts[0]))       # 成交量(股)
-                extra["price"] = float(parts[1])              # 成交价
-                extra["change_pct"] = float(parts[2]) * 100   # 涨跌幅 (已是小数, 转百分比)
-                extra["amount"] = float(parts[3])             # 成交额(元)
-            elif len(parts) >= 2:
-                extra["price"] = float(parts[0])
-                extra["change_pct"] = float(parts[1]) * 100
-        except Exception:
-            pass
-        return extra
+        parts = info.str.split(",", expand=True).reindex(columns=range(4))
+        nums = parts.apply(pd.to_numeric, errors="coerce").fillna(0.0)
+        # Field count from the split itself (absent trailing fields are null)
+        present = parts.notna().to_numpy()
+        full = present[:, 3]
+        short = present[:, 1] & ~full
+
+        c0, c1, c2, c3 = (nums[i].to_numpy(dtype=np.float64) for i in range(4))
+        zeros = np.zeros(len(info))
+        return pd.DataFrame({
+            "volume": np.where(full, c0, zeros).astype(np.int64),             # 成交量(股)
+            "price": np.where(full, c1, np.where(short, c0, zeros)),           # 成交价
+            "change_pct": np.where(full, c2, np.where(short, c1, zeros)) * 100,  # 涨跌幅 (已是小数, 转百分比)
+            "amount": np.where(full, c3, zeros),                               # 成交额(元)
+        }, index=info.index)
 
     @staticmethod
-    def scan_all(filter_mode: str = "all") -> List[Dict[str, Any]]:
+    @ttl_cache(ttl=TTL_ANOMALY_SCAN)
+    def scan_all(filter_mode: str = "all", limit: Optional[int] = None) -> List[Dict[str, Any]]:
         """
         Main scan: fetches EastMoney anomaly stream and formats it.
         Also persists new anomalies to DB.
+        If `limit` is given, only the newest `limit` alerts are returned (every row is still persisted).
+        Results are shared per (filter_mode, limit) for a few seconds; concurrent pollers wait on one scan.
         """
         alerts: List[Dict[str, Any]] = []
 
         # Pre-load filter sets
-        filter_codes: set | None = None
+        filter_codes: frozenset | None = None
         if filter_mode == "watchlist":
             from app.services.watchlist_service import WatchlistService
-            filter_codes = WatchlistService.get_codes()
+            filter_codes = frozenset(WatchlistService.get_codes())
             if not filter_codes:
                 return []  # No watchlist stocks
         elif filter_mode == "leaders":
-            from app.services.market_data import MarketDataService
             leaders = MarketDataService.get_leader_stocks()
-            filter_codes = {str(l["code"]) for l in leaders} if leaders else set()
+            # Leader codes are already strings (provider casts the column once)
+            filter_codes = frozenset(map(itemgetter("code"), leaders)) if leaders else frozenset()
 
         try:
             df = AnomalyDetector._fetch_changes()
             
             # Use current date for timestamp construction
-            today_str = datetime.now().strftime("%Y-%m-%d")
+            today = datetime.now()
+            y, m, d = today.year, today.month, today.day
+
+            # Filter membership in one vectorized pass; every row is still persisted below
+            if filter_codes is None:
+                keep = [True] * len(df)
+            else:
+                keep = df["code"].isin(filter_codes).tolist()
 
+            # Column-wise parsing/mapping; the loop below only formats and persists
+            parsed = AnomalyDetector._parse_info_frame(df["info"])
+            rows = zip(
+                df["type"].tolist(), df["code"].tolist(), df["name"].tolist(), df["time"].tolist(),
+                parsed["price"].tolist(), parsed["change_pct"].tolist(), parsed["amount"].tolist(),
+                keep,
+            )
+
+            # Rows are inserted in one batch after the loop; the unique index drops already-stored events
+            new_rows: List[Dict[str, Any]] = []
+            seen = set()  # repeats within this scan
             with Session(engine) as session:
-                for _, row in df.iterrows():
+                for change_type, code, name, time_str, price, change_pct, amount, wanted in rows:
                     try:
-                        change_type = str(row["板块"])
-                        code = str(row["代码"])
-                        name = str(row["名称"])
-                        time_str = str(row["时间"]) # HH:MM usually or HH:MM:SS
-                        info_str = str(row.get("相关信息", ""))
-
-                        # Apply filter (but maybe still persist all? For MVP, let's persist everything unique, return filtered)
-                        # Actually to save space/time, maybe only persist if matches filter? 
-                        # No, persist everything is safer for "Review".
-                        
-                        internal_type = TYPE_MAP.get(change_type, "rocket")
-                        severity = SEVERITY_MAP.get(change_type, "low")
-                        emoji = EMOJI_MAP.get(internal_type, "⚡")
-
-                        extra = AnomalyDetector._parse_info(info_str, change_type)
-                        price = extra.get("price", 0)
-                        change_pct = extra.get("change_pct", 0)
-                        amount = extra.get("amount", 0)
-
-                        # Build human-readable message
-                        if internal_type == "rocket":
-                            msg = f"{emoji} {change_type}！{name}({code}) 涨幅 {change_pct:+.1f}%，现价 ¥{price}"
-                        elif internal_type == "dive":
-                            msg = f"{emoji} {change_type}！{name}({code}) 跌幅 {change_pct:+.1f}%，现价 ¥{price}"
-                        elif internal_type == "big_order_buy":
-                            amount_wan = amount / 10000
-                            msg = f"{emoji} {change_type}！{name}({code}) 成交额 {amount_wan:.0f}万，涨幅 {change_pct:+.1f}%"
-                        elif internal_type == "big_order_sell":
-                            amount_wan = amount / 10000
-                            msg = f"{emoji} {change_type}！{name}({code}) 成交额 {amount_wan:.0f}万，跌幅 {change_pct:+.1f}%"
-                        else:
-                            msg = f"⚡ {change_type}！{name}({code})"
+                        internal_type, severity, emoji, template = CHANGE_ATTR.get(change_type, DEFAULT_CHANGE_ATTR)
+
+                        # Persist everything unique (for review), return only rows passing the filter
+                        msg = template(
+                            emoji=emoji, ct=change_type, name=name, code=code,
+                            price=price, pct=change_pct, amount_wan=amount / 10000,
+                        )
 
                         # Construct basic timestamp (approximate since year/sec might be missing)
                         # EastMoney time usually "10:05" or "10:05:32"
                         if len(time_str) == 5:
                             time_str += ":00"
-                        
-                        full_dt_str = f"{today_str} {time_str}"
-                        dt_obj = datetime.strptime(full_dt_str, "%Y-%m-%d %H:%M:%S")
-
-                        # Dedup check
-                        # Check last few records for this code? Or just exact match?
-                        # Since we poll every few seconds, we will see same items.
-                        # Simple query:
-                        existing = session.exec(
-                            select(AnomalyRecord)
-                            .where(AnomalyRecord.code == code)
-                            .where(AnomalyRecord.timestamp == dt_obj)
-                            .where(AnomalyRecord.type == internal_type)
-                        ).first()
-
-                        if not existing:
-                            record = AnomalyRecord(
-                                timestamp=dt_obj,
-                                code=code,
-                                name=name,
-                                type=internal_type,
-                                change_type=change_type,
-                                price=price,
-                                change_pct=change_pct,
-                                amount=amount,
-                                message=msg,
-                                severity=severity
-                            )
-                            session.add(record)
-                            session.commit() # Commit each to ensure ID is generated if needed, or commit batch at end? 
-                            # Commit each is safer for uniqueness check in same loop if duplicates in same batch? 
-                            # Actually list usually has one per event.
-                        
+
+                        # Fixed-width HH:MM:SS; slicing is much cheaper than strptime per row
+                        dt_obj = datetime(y, m, d, int(time_str[0:2]), int(time_str[3:5]), int(time_str[6:8]))
+
+                        # We poll every few seconds and see the same items again
+                        key = (code, dt_obj, internal_type)
+                        if key not in seen:
+                            seen.add(key)
+                            new_rows.append({
+                                "timestamp": dt_obj,
+                                "code": code,
+                                "name": name,
+                                "type": internal_type,
+                                "change_type": change_type,
+                                "price": price,
+                                "change_pct": change_pct,
+                                "amount": amount,
+                                "message": msg,
+                                "severity": severity,
+                            })
+
                         # Add to return list if passes filter
-                        if filter_codes is None or code in filter_codes:
+                        if wanted:
                             alerts.append({
                                 "type": internal_type,
                                 "change_type": change_type,
@@ -206,6 +229,21 @@ class AnomalyDetector:
                         logger.error(f"Error processing anomaly row: {e}")
                         continue
 
+                inserted = 0
+                if new_rows:
+                    result = session.execute(
+                        sqlite_insert(AnomalyRecord.__table__).on_conflict_do_nothing(
+                            index_elements=["code", "timestamp", "type"]
+                        ),
+                        new_rows,
+                    )
+                    session.commit()
+                    inserted = result.rowcount
+
+            if inserted:
+                from app.services.agent_service import AgentService
+                AgentService.notify()
+
         except Exception as e:
             logger.error(f"Error in anomaly scan: {e}")
             alerts.append({
@@ -215,9 +253,16 @@ class AnomalyDetector:
                 "ts": int(time.time()),
             })
 
-        # Sort by time descending
-        alerts.sort(key=lambda x: x.get("ts", 0), reverse=True)
+        # Sort by time descending (top-K selection when limited)
+        if limit is not None:
+            return heapq.nlargest(limit, alerts, key=itemgetter("ts"))
+        alerts.sort(key=itemgetter("ts"), reverse=True)
 
         return alerts
 
+    @staticmethod
+    async def scan_all_async(filter_mode: str = "all", limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """scan_all off the event loop (upstream fetch and DB writes are blocking)."""
+        return await asyncio.to_thread(AnomalyDetector.scan_all, filter_mode, limit)
+
 
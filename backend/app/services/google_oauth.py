@@ -9,9 +9,20 @@ from typing import Optional
 from urllib.parse import urlencode
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 logger = logging.getLogger(__name__)
 
+# 共享 keep-alive 会话: token 刷新 / 用户信息请求复用到 Google 的连接, 免去每次 TLS 握手
+# 连接失败自动重试; 5xx 只对幂等请求 (userinfo GET) 重试, 授权码换 token 不会被重复提交
+_session = requests.Session()
+_session.mount("https://", HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=10,
+    max_retries=Retry(total=2, backoff_factor=0.2, status_forcelist=(502, 503, 504), raise_on_status=False),
+))
+
 # OAuth2 配置
 GOOGLE_CLIENT_ID = os.getenv("GOOGLE_CLIENT_ID", "")
 GOOGLE_CLIENT_SECRET = os.getenv("GOOGLE_CLIENT_SECRET", "")
@@ -70,7 +81,7 @@ class GoogleOAuthService:
         if not GOOGLE_CLIENT_ID or not GOOGLE_CLIENT_SECRET:
             raise ValueError("Google OAuth credentials not configured.")
 
-        response = requests.post(
+        response = _session.post(
             TOKEN_ENDPOINT,
             data={
                 "client_id": GOOGLE_CLIENT_ID,
@@ -94,7 +105,7 @@ class GoogleOAuthService:
         使用 refresh_token 获取新的 access_token
         返回 { access_token, expires_in, ... }
         """
-        response = requests.post(
+        response = _session.post(
             TOKEN_ENDPOINT,
             data={
                 "client_id": GOOGLE_CLIENT_ID,
@@ -117,7 +128,7 @@ class GoogleOAuthService:
         获取 Google 用户信息
         返回 { id, email, name, picture, ... }
         """
-        response = requests.get(
+        response = _session.get(
             USERINFO_ENDPOINT,
             headers={"Authorization": f"Bearer {access_token}"},
             timeout=10,
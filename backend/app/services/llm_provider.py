@@ -3,13 +3,16 @@ LLM 提供商管理器
 负责配置读写、提供商 CRUD、模型切换、连接测试
 """
 
-import json
+import atexit
 import os
 import logging
+import threading
 from datetime import datetime, timezone
+from functools import lru_cache
 from pathlib import Path
 from typing import Optional, Tuple
 
+import orjson
 from openai import OpenAI
 
 from app.models.llm_config import (
@@ -29,6 +32,20 @@ logger = logging.getLogger(__name__)
 # 配置文件路径
 CONFIG_DIR = Path(__file__).parent.parent
 CONFIG_FILE = CONFIG_DIR / "llm_config.json"
+# 连续修改在空闲这么久后合并为一次写盘
+SAVE_DEBOUNCE_SECONDS = 0.2
+# OAuth token 剩余有效期低于此值 (秒) 时提前在后台刷新
+TOKEN_REFRESH_MARGIN = 60
+
+
+@lru_cache(maxsize=8)
+def _cached_client(api_key: str, base_url: Optional[str]) -> OpenAI:
+    """
+    按 (api_key, base_url) 复用 OpenAI 客户端, 保留 keep-alive 连接池 (省去每次请求的 TLS 握手)
+    OAuth token 刷新后 key 变化, 自然生成新客户端, 旧客户端由 LRU 淘汰
+    提供商凭据被修改或删除时整体清空
+    """
+    return OpenAI(api_key=api_key, base_url=base_url)
 
 
 class LLMProviderManager:
@@ -36,15 +53,26 @@ class LLMProviderManager:
 
     _instance: Optional["LLMProviderManager"] = None
     _config: Optional[LLMConfigFile] = None
+    _save_lock = threading.Lock()
+    _save_timer: Optional[threading.Timer] = None
+    _dirty = False
+    _refresh_locks: dict = {}  # provider_id -> threading.Lock
 
     def __new__(cls) -> "LLMProviderManager":
         if cls._instance is None:
             cls._instance = super().__new__(cls)
+            # 进程退出前落盘尚未写出的修改
+            atexit.register(cls._instance._flush_in_background)
         return cls._instance
 
     def __init__(self):
         if self._config is None:
             self._config = self._load_config()
+            self._index_providers()
+
+    def _index_providers(self) -> None:
+        """按 ID 建立提供商索引 (与 providers 列表同步维护)"""
+        self._by_id = {p.id: p for p in self._config.providers}
 
     # ---- 配置读写 ----
 
@@ -52,26 +80,67 @@ class LLMProviderManager:
         """从 JSON 文件加载配置"""
         if CONFIG_FILE.exists():
             try:
-                data = json.loads(CONFIG_FILE.read_text(encoding="utf-8"))
-                return LLMConfigFile(**data)
+                return LLMConfigFile.model_validate(orjson.loads(CONFIG_FILE.read_bytes()))
             except Exception as e:
                 logger.error(f"Failed to load LLM config: {e}")
         return LLMConfigFile()
 
-    def _save_config(self) -> None:
-        """保存配置到 JSON 文件"""
+    def _save_config(self, defer: bool = False) -> None:
+        """
+        保存配置
+        用户发起的修改 (默认) 立即写盘, 失败时抛出异常, 由调用方感知
+        defer=True 用于后台修改 (如 token 刷新): 由定时器在短暂空闲后写盘, 突发的多次修改只写一次文件
+        """
+        cls = type(self)
+        with cls._save_lock:
+            cls._dirty = True
+        if not defer:
+            self.flush_config()
+            return
+        with cls._save_lock:
+            if cls._save_timer is not None:
+                cls._save_timer.cancel()
+            cls._save_timer = threading.Timer(SAVE_DEBOUNCE_SECONDS, self._flush_in_background)
+            cls._save_timer.daemon = True
+            cls._save_timer.start()
+
+    def _flush_in_background(self) -> None:
+        """定时器 / atexit 入口: 没有调用方可接收异常, 失败已在 flush_config 中记录"""
         try:
-            CONFIG_FILE.write_text(
-                self._config.model_dump_json(indent=2),
-                encoding="utf-8",
-            )
-        except Exception as e:
-            logger.error(f"Failed to save LLM config: {e}")
-            raise
+            self.flush_config()
+        except Exception:
+            pass
+
+    def flush_config(self) -> None:
+        """
+        立即把待写的修改保存到 JSON 文件 (临时文件 + os.replace, 原子替换)
+        失败时保留待写标记 (下次保存重试) 并抛出异常
+        """
+        cls = type(self)
+        with cls._save_lock:
+            if cls._save_timer is not None:
+                cls._save_timer.cancel()
+                cls._save_timer = None
+            if not cls._dirty:
+                return
+
+            tmp_file = CONFIG_FILE.with_name(CONFIG_FILE.name + ".tmp")
+            try:
+                # 保留缩进, 方便手工查看/编辑
+                tmp_file.write_bytes(
+                    orjson.dumps(self._config.model_dump(mode="json"), option=orjson.OPT_INDENT_2)
+                )
+                os.replace(tmp_file, CONFIG_FILE)
+            except Exception as e:
+                logger.error(f"Failed to save LLM config: {e}")
+                raise
+            cls._dirty = False
 
     def reload_config(self) -> None:
-        """重新加载配置"""
+        """重新加载配置 (先写出待保存的修改)"""
+        self.flush_config()
         self._config = self._load_config()
+        self._index_providers()
 
     # ---- 提供商管理 ----
 
@@ -81,10 +150,7 @@ class LLMProviderManager:
 
     def get_provider(self, provider_id: str) -> Optional[ProviderConfig]:
         """按 ID 获取提供商"""
-        for p in self._config.providers:
-            if p.id == provider_id:
-                return p
-        return None
+        return self._by_id.get(provider_id)
 
     def add_provider(self, request: AddProviderRequest) -> ProviderConfig:
         """添加新提供商"""
@@ -101,6 +167,7 @@ class LLMProviderManager:
         )
 
         self._config.providers.append(config)
+        self._by_id[config.id] = config
 
         # 如果是第一个提供商，自动设为激活
         if self._config.active_model is None and config.models:
@@ -124,6 +191,8 @@ class LLMProviderManager:
             provider.api_key = request.api_key
         if request.base_url is not None:
             provider.base_url = request.base_url
+        if request.api_key is not None or request.base_url is not None:
+            _cached_client.cache_clear()  # 丢弃按旧凭据缓存的客户端
         if request.models is not None:
             provider.models = request.models
         if request.enabled is not None:
@@ -141,6 +210,8 @@ class LLMProviderManager:
         self._config.providers = [
             p for p in self._config.providers if p.id != provider_id
         ]
+        self._by_id.pop(provider_id, None)
+        _cached_client.cache_clear()
 
         # 如果删除的是当前激活的提供商，清除激活状态
         if (
@@ -203,6 +274,7 @@ class LLMProviderManager:
         )
 
         self._config.providers.append(config)
+        self._by_id[config.id] = config
 
         # 自动设为激活
         if config.models:
@@ -221,23 +293,59 @@ class LLMProviderManager:
         expiry = datetime.now(timezone.utc) + timedelta(seconds=expires_in)
         return expiry.isoformat()
 
+    @staticmethod
+    def _token_seconds_left(provider: ProviderConfig) -> Optional[float]:
+        """距 token 过期的秒数; 无法判断时返回 None"""
+        if not provider.oauth_tokens.token_expiry:
+            return None
+        try:
+            expiry = datetime.fromisoformat(provider.oauth_tokens.token_expiry)
+            return (expiry - datetime.now(timezone.utc)).total_seconds()
+        except (ValueError, TypeError):
+            return None
+
     def _ensure_oauth_token_fresh(self, provider: ProviderConfig) -> bool:
-        """检查并刷新 OAuth token"""
+        """
+        检查并刷新 OAuth token
+        临近过期 (TOKEN_REFRESH_MARGIN 内) 时后台刷新, 本次仍使用当前 token;
+        只有已过期才在调用方线程同步刷新
+        """
         if not provider.oauth_tokens or not provider.oauth_tokens.refresh_token:
             return False
 
-        # 检查是否过期
-        if provider.oauth_tokens.token_expiry:
-            try:
-                expiry = datetime.fromisoformat(provider.oauth_tokens.token_expiry)
-                now = datetime.now(timezone.utc)
-                if now < expiry:
-                    return True  # 还未过期
-            except (ValueError, TypeError):
-                pass
-
-        # 刷新 token
+        left = self._token_seconds_left(provider)
+        if left is not None and left > 0:
+            if left < TOKEN_REFRESH_MARGIN:
+                lock = self._refresh_locks.setdefault(provider.id, threading.Lock())
+                # 已有刷新在进行则不再起线程; 锁交给后台线程, 刷新结束时释放
+                if lock.acquire(blocking=False):
+                    try:
+                        threading.Thread(
+                            target=self._refresh_locked,
+                            args=(provider, lock, TOKEN_REFRESH_MARGIN),
+                            daemon=True,
+                        ).start()
+                    except Exception:
+                        lock.release()
+                        raise
+            return True  # 还未过期
+
+        return self._refresh_oauth_token(provider)
+
+    def _refresh_oauth_token(self, provider: ProviderConfig) -> bool:
+        """同步刷新 token; 同一提供商同时只有一个刷新请求, 其余调用等待其完成"""
+        lock = self._refresh_locks.setdefault(provider.id, threading.Lock())
+        lock.acquire()
+        return self._refresh_locked(provider, lock, 0)
+
+    def _refresh_locked(self, provider: ProviderConfig, lock: threading.Lock, margin: float) -> bool:
+        """持有 lock 时执行刷新 (剩余有效期仍大于 margin 则跳过), 结束时释放 lock"""
         try:
+            # 等锁期间可能已被其他线程刷新
+            left = self._token_seconds_left(provider)
+            if left is not None and left > margin:
+                return True
+
             from app.services.google_oauth import GoogleOAuthService
             new_tokens = GoogleOAuthService.refresh_access_token(
                 provider.oauth_tokens.refresh_token
@@ -246,12 +354,14 @@ class LLMProviderManager:
             provider.oauth_tokens.token_expiry = self._calc_expiry(
                 new_tokens.get("expires_in", 3600)
             )
-            self._save_config()
+            self._save_config(defer=True)  # 后台刷新, 无需等待写盘
             logger.info(f"Refreshed OAuth token for {provider.name}")
             return True
         except Exception as e:
             logger.error(f"Failed to refresh OAuth token: {e}")
             return False
+        finally:
+            lock.release()
 
     # ---- 模型切换 ----
 
@@ -320,7 +430,7 @@ class LLMProviderManager:
             api_key = os.getenv("OPENAI_API_KEY")
             if api_key:
                 base_url = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
-                return OpenAI(api_key=api_key, base_url=base_url), "gpt-3.5-turbo"
+                return _cached_client(api_key, base_url), "gpt-3.5-turbo"
             return None, None
 
         provider = self.get_provider(active.provider_id)
@@ -335,10 +445,7 @@ class LLMProviderManager:
         if not provider.api_key:
             return None, None
 
-        client = OpenAI(
-            api_key=provider.api_key,
-            base_url=provider.base_url or None,
-        )
+        client = _cached_client(provider.api_key, provider.base_url or None)
         return client, active.model_name
 
     def _get_vertex_client(
@@ -366,10 +473,7 @@ class LLMProviderManager:
             f"projects/{project_id}/locations/{location}/endpoints/openapi"
         )
 
-        client = OpenAI(
-            api_key=access_token,  # OAuth token 作为 API key
-            base_url=base_url,
-        )
+        client = _cached_client(access_token, base_url)  # OAuth token 作为 API key
         return client, model_name
 
     # ---- 提供商预设 ----
@@ -1,6 +1,8 @@
 
+import bisect
 import logging
 import time
+import orjson
 from typing import List, Dict, Any, Optional
 from tenacity import retry, stop_after_attempt, wait_fixed
 from app.core.data_provider import DataProvider
@@ -10,16 +12,21 @@ logger = logging.getLogger(__name__)
 class LogicChainService:
     _concepts_cache = []
     _concepts_cache_time = 0
+    # Search index over the cached list: concepts sorted by (len, name), their
+    # newline-joined blob + start offset of each concept
+    _search_source: Optional[List[str]] = None
+    _search_sorted: List[str] = []
+    _search_blob = ""
+    _search_starts: List[int] = []
     CACHE_FILE = "data/concepts_cache.json"
 
     @staticmethod
     def _load_cache_from_file():
-        import json
         import os
         if os.path.exists(LogicChainService.CACHE_FILE):
             try:
-                with open(LogicChainService.CACHE_FILE, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
+                with open(LogicChainService.CACHE_FILE, 'rb') as f:
+                    data = orjson.loads(f.read())
                     LogicChainService._concepts_cache = data
                     LogicChainService._concepts_cache_time = time.time()
                     return data
@@ -29,12 +36,11 @@ class LogicChainService:
 
     @staticmethod
     def _save_cache_to_file(data):
-        import json
         import os
         os.makedirs(os.path.dirname(LogicChainService.CACHE_FILE), exist_ok=True)
         try:
-            with open(LogicChainService.CACHE_FILE, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False)
+            with open(LogicChainService.CACHE_FILE, 'wb') as f:
+                f.write(orjson.dumps(data))
         except Exception as e:
             logger.error(f"Error saving cache file: {e}")
 
@@ -72,32 +78,82 @@ class LogicChainService:
         
         return []
 
+    @staticmethod
+    async def get_all_concepts_async() -> List[str]:
+        """
+        Async variant of get_all_concepts.
+        Races the concept sources instead of falling back serially.
+        """
+        import asyncio
+        now = time.time()
+
+        # Memory cache
+        if LogicChainService._concepts_cache and (now - LogicChainService._concepts_cache_time < 3600):
+            return LogicChainService._concepts_cache
+
+        concepts = await DataProvider.get_all_concepts_async()
+        if concepts:
+            LogicChainService._concepts_cache = concepts
+            LogicChainService._concepts_cache_time = now
+            await asyncio.to_thread(LogicChainService._save_cache_to_file, concepts)
+            return concepts
+
+        # Fallback to file cache
+        cached = await asyncio.to_thread(LogicChainService._load_cache_from_file)
+        if cached:
+            logger.info("Used file cache for concepts.")
+            return cached
+
+        return []
+
     @staticmethod
     def search_concepts(query: str, limit: int = 10) -> List[str]:
         """
         Search for concepts by name.
         """
         all_concepts = LogicChainService.get_all_concepts()
-        if not all_concepts:
+        if not all_concepts or "\n" in query:
             return []
-        
-        # Simple fuzzy match
-        results = [c for c in all_concepts if query in c]
-        
-        # Sort by length (shorter match first) and alphabetically
-        results.sort(key=lambda x: (len(x), x))
-        
-        return results[:limit]
+
+        # Substring match via str.find over one blob, mapped back with bisect.
+        # The blob is pre-sorted (shorter first, then alphabetically), so matches
+        # arrive in result order and the scan stops after `limit` hits.
+        blob, starts, ordered = LogicChainService._search_index(all_concepts)
+        results = []
+        pos = blob.find(query)
+        while pos != -1 and len(results) < limit:
+            i = bisect.bisect_right(starts, pos) - 1
+            results.append(ordered[i])
+            # Resume at the next concept so each one is reported once
+            pos = blob.find(query, starts[i] + len(ordered[i]) + 1)
+
+        return results
+
+    @staticmethod
+    def _search_index(concepts: List[str]):
+        """(blob, starts, ordered) for `concepts`, rebuilt only when the cached list object changes."""
+        if LogicChainService._search_source is not concepts:
+            ordered = sorted(concepts, key=lambda c: (len(c), c))
+            starts = []
+            offset = 0
+            for c in ordered:
+                starts.append(offset)
+                offset += len(c) + 1
+            LogicChainService._search_blob = "\n".join(ordered)
+            LogicChainService._search_starts = starts
+            LogicChainService._search_sorted = ordered
+            LogicChainService._search_source = concepts
+        return LogicChainService._search_blob, LogicChainService._search_starts, LogicChainService._search_sorted
 
     @staticmethod
     @retry(stop=stop_after_attempt(3), wait=wait_fixed(2))
-    def get_concept_stocks(concept_name: str) -> List[Dict[str, Any]]:
+    def get_concept_stocks(concept_name: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
         """
         Get constituent stocks for a concept using DataProvider.
         Returns Top stocks by change_pct.
         """
         try:
-            return DataProvider.get_concept_stocks(concept_name)
+            return DataProvider.get_concept_stocks(concept_name, limit)
         except Exception as e:
             logger.error(f"Error in DataProvider.get_concept_stocks: {e}")
             return []
@@ -121,10 +177,8 @@ class LogicChainService:
             }
         
         best_match = concepts[0]
-        leaders = LogicChainService.get_concept_stocks(best_match)
-        
         # Top 5 leaders
-        top_leaders = leaders[:5]
+        top_leaders = LogicChainService.get_concept_stocks(best_match, limit=5)
 
         return {
             "query": user_query,
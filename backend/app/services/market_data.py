@@ -1,11 +1,14 @@
 import logging
 import pandas as pd
-from typing import List, Dict, Any, Optional
+from types import MappingProxyType
+from typing import List, Dict, Any, Mapping, Optional
 import os
+import threading
 import time
+from datetime import date
 from functools import lru_cache
 from tenacity import retry, stop_after_attempt, wait_fixed
-from app.utils.cache import ttl_cache
+from app.utils.cache import ttl_cache, TTL_SECTOR, TTL_LEADERS, TTL_ACTIVITY
 
 # Import Provider
 from app.providers.akshare_provider import AkShareProvider
@@ -32,29 +35,40 @@ class MarketDataService:
     # Initialize Provider
     _provider = AkShareProvider()
     
-    # Cache for stock codes map
-    _stock_codes_map = {}
+    # Cache for stock codes map (parsed once; the lock keeps concurrent first callers from parsing twice).
+    # Read-only view, so it can be handed out and read from any thread without copying.
+    _stock_codes_map: Mapping[str, str] = MappingProxyType({})
+    _stock_codes_loaded = False
+    _stock_codes_lock = threading.Lock()
 
     @staticmethod
     def _load_stock_codes():
-        if MarketDataService._stock_codes_map:
+        if MarketDataService._stock_codes_loaded:
             return
-        try:
-            csv_path = os.path.join(os.path.dirname(__file__), "../stock_codes.csv")
-            if os.path.exists(csv_path):
-                df = pd.read_csv(csv_path, dtype=str)
-                # Map name to code
-                MarketDataService._stock_codes_map = dict(zip(df['name'], df['code']))
-        except Exception as e:
-            logger.error(f"Error loading stock codes: {e}")
+        with MarketDataService._stock_codes_lock:
+            if MarketDataService._stock_codes_loaded:
+                return
+            try:
+                csv_path = os.path.join(os.path.dirname(__file__), "../stock_codes.csv")
+                if os.path.exists(csv_path):
+                    df = pd.read_csv(csv_path, usecols=["name", "code"], dtype=str, engine="c")
+                    # Map name to code
+                    MarketDataService._stock_codes_map = MappingProxyType(
+                        dict(zip(df['name'].to_numpy(), df['code'].to_numpy()))
+                    )
+            except Exception as e:
+                logger.error(f"Error loading stock codes: {e}")
+            MarketDataService._stock_codes_loaded = True
 
     @staticmethod
     def get_code_by_name(name: str) -> str:
-        MarketDataService._load_stock_codes()
+        # Flag check inline: after the first call this is a single dict lookup
+        if not MarketDataService._stock_codes_loaded:
+            MarketDataService._load_stock_codes()
         return MarketDataService._stock_codes_map.get(name, "")
 
     @staticmethod
-    @ttl_cache(ttl=300) # Cache 5 mins
+    @ttl_cache(ttl=TTL_SECTOR)
     def get_sector_heatmap() -> List[Dict[str, Any]]:
         try:
             data = MarketDataService._provider.get_sector_heatmap_data()
@@ -66,25 +80,18 @@ class MarketDataService:
             return _get_mock_heatmap()
 
     @staticmethod
-    @ttl_cache(ttl=60) # Cache 1 min
+    @ttl_cache(ttl=TTL_LEADERS)
     def get_leader_stocks() -> List[Dict[str, Any]]:
         try:
-            data = MarketDataService._provider.get_leader_stocks_data()
-            
-            # Post-processing filter (logic moved here or keep in provider? Provider gave raw-ish data)
-            # Provider returns {code, name, price, change_pct, volume_ratio}
-            # We filter for strong stocks (> 3%)
-            
-            filtered = [s for s in data if s['change_pct'] >= 3.0]
-            
-            # Limit to top 30
-            return filtered[:30] if filtered else _get_mock_leaders()
+            # Strong stocks (>= 3%), top 30 by popularity rank; filtered on the provider's frame
+            data = MarketDataService._provider.get_leader_stocks_data(min_change_pct=3.0, limit=30)
+            return data if data else _get_mock_leaders()
         except Exception as e:
             logger.error(f"Error serving leaders: {e}")
             return _get_mock_leaders()
 
     @staticmethod
-    @ttl_cache(ttl=60)
+    @ttl_cache(ttl=TTL_ACTIVITY)
     def get_market_sentiment() -> Dict[str, Any]:
         """
         Get market sentiment metrics.
@@ -99,19 +106,25 @@ class MarketDataService:
                     "ts": ""
                 }
             
-            # Add temperature alias
-            data["temperature"] = data.get("activity", 0.0)
-            return data
+            # Add temperature alias (on a copy; `data` is the provider's cached dict)
+            return {**data, "temperature": data.get("activity", 0.0)}
         except Exception as e:
              logger.error(f"Error serving sentiment: {e}")
              return {}
 
     @staticmethod
-    @ttl_cache(ttl=3600)
     def get_macro_events() -> List[Dict[str, Any]]:
+        # Cached in the provider (TTL_MACRO for today), shared with get_macro_events_range
         try:
             return MarketDataService._provider.get_economic_calendar()
         except Exception as e:
             logger.error(f"Error serving macro events: {e}")
             return []
 
+    @staticmethod
+    async def get_macro_events_range(start: date, end: date) -> List[Dict[str, Any]]:
+        try:
+            return await MarketDataService._provider.get_economic_calendar_range(start, end)
+        except Exception as e:
+            logger.error(f"Error serving macro events range: {e}")
+            return []
@@ -1,20 +1,99 @@
 
 import logging
+import queue
+import threading
+import time
+import numpy as np
 import pandas as pd
-import akshare as ak
 from datetime import datetime
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional, Tuple
 from sqlmodel import Session, select, desc
 
 from app.utils.cache import ttl_cache
+from app.utils.timeout import AKSHARE_TIMEOUT, submit_call, result_by
 from app.db.database import engine
 from app.models.sentiment import SentimentRecord
 
 logger = logging.getLogger(__name__)
 
-from app.providers.akshare_provider import AkShareProvider
+from app.services.market_data import MarketDataService
+
+# Sentiment records are committed off the request path by one daemon writer thread
+_WRITE_BATCH = 32
+_write_q: "queue.Queue[SentimentRecord]" = queue.Queue(maxsize=64)
+_writer: Optional[threading.Thread] = None
+_writer_lock = threading.Lock()
+
+
+def _write_records(records: List[SentimentRecord]):
+    """Commit a batch in one transaction, then record it as the newest save and wake the agent."""
+    # Read before commit: committed instances are expired and detached once the session closes
+    newest = max(records, key=lambda r: r.timestamp)
+    last = (newest.mood_index, newest.timestamp)
+    try:
+        with Session(engine) as session:
+            session.add_all(records)
+            session.commit()
+    except Exception as e:
+        logger.error(f"DB Error in market sentiment: {e}")
+        return
+
+    # Only a committed record counts for the save throttle and the trend baseline
+    current = MarketSentimentService._last_record
+    if current is None or current[1] < last[1]:
+        MarketSentimentService._last_record = last
+
+    from app.services.agent_service import AgentService
+    AgentService.notify()
+
+
+def _writer_loop():
+    while True:
+        batch = [_write_q.get()]
+        # Drain whatever else is queued so a burst costs one commit
+        while len(batch) < _WRITE_BATCH:
+            try:
+                batch.append(_write_q.get_nowait())
+            except queue.Empty:
+                break
+        _write_records(batch)
+
+
+def _enqueue_record(record: SentimentRecord):
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = threading.Thread(target=_writer_loop, name="sentiment-writer", daemon=True)
+                _writer.start()
+    try:
+        _write_q.put_nowait(record)
+    except queue.Full:
+        # Writer is stuck behind a slow DB; write inline rather than drop the record
+        _write_records([record])
+
 
 class MarketSentimentService:
+    # Same instance as MarketDataService: provider caches key on `self`, so sharing it
+    # lets sentiment and market overview hit one Legu activity cache entry
+    _provider = MarketDataService._provider
+    # (mood_index, timestamp) of the newest saved SentimentRecord, loaded lazily from the DB
+    _last_record: Optional[Tuple[float, datetime]] = None
+    _last_record_loaded = False
+
+    @staticmethod
+    def _last_saved() -> Optional[Tuple[float, datetime]]:
+        """Newest saved (mood_index, timestamp); only the first call queries the DB."""
+        if not MarketSentimentService._last_record_loaded:
+            with Session(engine) as session:
+                prev_record = session.exec(
+                    select(SentimentRecord).order_by(desc(SentimentRecord.timestamp)).limit(1)
+                ).first()
+            if prev_record:
+                MarketSentimentService._last_record = (prev_record.mood_index, prev_record.timestamp)
+            MarketSentimentService._last_record_loaded = True
+        return MarketSentimentService._last_record
+
     @staticmethod
     @ttl_cache(ttl=60) # Cache for 1 minute
     def get_market_sentiment() -> Dict[str, Any]:
@@ -26,12 +105,22 @@ class MarketSentimentService:
         4. Calculate Mood Index
         """
         try:
+            import akshare as ak
             date_str = datetime.now().strftime("%Y%m%d")
             
+            # --- EastMoney pools (zt / zb / dt / previous) ---
+            # Started together on the shared pool and collected against one deadline,
+            # so a cache miss costs the slowest pool rather than the sum of all four
+            deadline = time.monotonic() + AKSHARE_TIMEOUT
+            f_zt = submit_call(ak.stock_zt_pool_em, date=date_str)
+            f_zb = submit_call(ak.stock_zt_pool_zbgc_em, date=date_str)
+            f_dt = submit_call(ak.stock_zt_pool_dtgc_em, date=date_str)
+            f_prev_zt = submit_call(ak.stock_zt_pool_previous_em, date=date_str)
+
             # --- 1. Broad Market Counts (Legu) ---
             # We use this for Up/Down/Flat counts as it's a good summary
-            provider = AkShareProvider()
-            legu_data = provider.get_market_activity_data()
+            # (fetched on this thread while the pools are in flight)
+            legu_data = MarketSentimentService._provider.get_market_activity_data()
             up_count = legu_data.get("up_count", 0)
             down_count = legu_data.get("down_count", 0)
             flat_count = legu_data.get("flat_count", 0)
@@ -39,24 +128,24 @@ class MarketSentimentService:
             # --- 2. Specialized Pools (EastMoney) ---
             # We prefer EastMoney for Limit Up/Fried stats as they are more accurate for "Mood"
             
-            # Fetch Limit Up Pool
+            # Limit Up Pool
             try:
-                df_zt = ak.stock_zt_pool_em(date=date_str)
+                df_zt = result_by(f_zt, deadline, "stock_zt_pool_em")
                 zt_count = len(df_zt) if not df_zt.empty else 0
             except Exception:
                 zt_count = legu_data.get("limit_up_count", 0) # Fallback to Legu
                 df_zt = pd.DataFrame()
 
-            # Fetch Fried Board Pool
+            # Fried Board Pool
             try:
-                df_zb = ak.stock_zt_pool_zbgc_em(date=date_str)
+                df_zb = result_by(f_zb, deadline, "stock_zt_pool_zbgc_em")
                 zb_count = len(df_zb) if not df_zb.empty else 0
             except Exception:
                 zb_count = 0 # Legu doesn't have fried board count easily
 
-            # Fetch Limit Down Pool (EastMoney) - More accurate for traders
+            # Limit Down Pool (EastMoney) - More accurate for traders
             try:
-                df_dt = ak.stock_zt_pool_dtgc_em(date=date_str)
+                df_dt = result_by(f_dt, deadline, "stock_zt_pool_dtgc_em")
                 dt_count = len(df_dt) if not df_dt.empty else 0
             except Exception:
                 dt_count = legu_data.get("limit_down_count", 0) # Fallback to Legu
@@ -66,13 +155,14 @@ class MarketSentimentService:
             total_attempt = zt_count + zb_count
             fried_rate = (zb_count / total_attempt * 100) if total_attempt > 0 else 0
 
-            # Fetch Yesterday Limit Up Pool Performance
+            # Yesterday Limit Up Pool Performance
             try:
-                df_prev_zt = ak.stock_zt_pool_previous_em(date=date_str)
+                df_prev_zt = result_by(f_prev_zt, deadline, "stock_zt_pool_previous_em")
                 if not df_prev_zt.empty and '涨跌幅' in df_prev_zt.columns:
-                    premium_rate = df_prev_zt['涨跌幅'].mean()
-                    success_count = len(df_prev_zt[df_prev_zt['涨跌幅'] > 9.5])
-                    promotion_rate = (success_count / len(df_prev_zt) * 100)
+                    # One float64 view of the column; nanmean matches pandas' NaN-skipping mean
+                    chg = df_prev_zt['涨跌幅'].to_numpy(dtype=np.float64, copy=False)
+                    premium_rate = np.nanmean(chg)
+                    promotion_rate = np.count_nonzero(chg > 9.5) / chg.size * 100
                 else:
                     premium_rate = 0
                     promotion_rate = 0
@@ -88,43 +178,42 @@ class MarketSentimentService:
             # --- Persistence & Trend Analysis ---
             trend = "flat"
             try:
-                with Session(engine) as session:
-                    # 1. Get previous record
-                    prev_record = session.exec(
-                        select(SentimentRecord).order_by(desc(SentimentRecord.timestamp)).limit(1)
-                    ).first()
-                    
-                    if prev_record:
-                        if mood > prev_record.mood_index + 0.5:
-                            trend = "up"
-                        elif mood < prev_record.mood_index - 0.5:
-                            trend = "down"
-                    
-                    # 2. Save current record
-                    # Only save if changed significantly? 
-                    # For MVP, let's save every time called (but capped by cache 60s)
-                    # To avoid spamming DB, we could check if last record was very recent.
-                    
-                    should_save = True
-                    if prev_record:
-                        # If less than 60s since last save, skip saving to DB but use calculated trend
-                        time_diff = (datetime.utcnow() - prev_record.timestamp).total_seconds()
-                        if time_diff < 50: 
-                            should_save = False
-                    
-                    if should_save:
-                        record = SentimentRecord(
-                            mood_index=mood,
-                            up_count=up_count, 
-                            down_count=down_count,
-                            limit_up_count=zt_count,
-                            limit_down_count=dt_count, # Use EastMoney data
-                            fried_rate=fried_rate,
-                            temperature=mood, # Mood as temp
-                            trend=trend
-                        )
-                        session.add(record)
-                        session.commit()
+                # 1. Previous record (kept in memory; the DB is read once per process)
+                prev = MarketSentimentService._last_saved()
+                if prev:
+                    prev_mood, prev_ts = prev
+                    if mood > prev_mood + 0.5:
+                        trend = "up"
+                    elif mood < prev_mood - 0.5:
+                        trend = "down"
+                
+                # 2. Save current record
+                # Only save if changed significantly? 
+                # For MVP, let's save every time called (but capped by cache 60s)
+                # To avoid spamming DB, we could check if last record was very recent.
+                
+                now_utc = datetime.utcnow()
+                should_save = True
+                if prev:
+                    # If less than 60s since last save, skip saving to DB but use calculated trend
+                    time_diff = (now_utc - prev_ts).total_seconds()
+                    if time_diff < 50: 
+                        should_save = False
+                
+                if should_save:
+                    record = SentimentRecord(
+                        timestamp=now_utc,
+                        mood_index=mood,
+                        up_count=up_count, 
+                        down_count=down_count,
+                        limit_up_count=zt_count,
+                        limit_down_count=dt_count, # Use EastMoney data
+                        fried_rate=fried_rate,
+                        temperature=mood, # Mood as temp
+                        trend=trend
+                    )
+                    # Committed by the background writer (which also wakes the agent)
+                    _enqueue_record(record)
                         
             except Exception as e:
                 logger.error(f"DB Error in market sentiment: {e}")
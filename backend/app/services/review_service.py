@@ -1,6 +1,8 @@
 import os
 import time
 import json
+import heapq
+from operator import itemgetter
 from typing import Dict, Any, Tuple
 from openai import OpenAI
 from datetime import datetime
@@ -91,7 +93,7 @@ class DailyReviewService:
     def _build_context(sentiment, heatmap, leaders) -> str:
         """Helper to build market context string for LLM."""
         top_sectors = heatmap[:5] if heatmap else []
-        bottom_sectors = sorted(heatmap, key=lambda x: x.get("change_pct", 0))[:3] if heatmap else []
+        bottom_sectors = heapq.nsmallest(3, heatmap, key=itemgetter("change_pct")) if heatmap else []
         top_leaders = leaders[:5] if leaders else []
 
         context_lines = [
@@ -154,7 +156,7 @@ class DailyReviewService:
                 }
             else:
                 report = DailyReviewService._generate_template_report(
-                    sentiment, heatmap[:5], sorted(heatmap, key=lambda x: x.get("change_pct", 0))[:3], leaders[:5]
+                    sentiment, heatmap[:5], heapq.nsmallest(3, heatmap, key=itemgetter("change_pct")), leaders[:5]
                 )
                 return {
                     "report": report,
@@ -5,6 +5,7 @@ import requests
 import asyncio
 import logging
 from typing import Dict, List, Any, Optional
+from app.core.ta_kernels import kdj_smooth
 
 logger = logging.getLogger(__name__)
 
@@ -56,21 +57,7 @@ class StockAnalysisService:
         # Using recursive calculation for KDJ is better but for MVP ewm is okay-ish or loop.
         # Standard KDJ uses SMA(1/3).
         
-        k_values = []
-        d_values = []
-        k = 50
-        d = 50
-        
-        for i in range(len(df)):
-            if np.isnan(rsv.iloc[i]):
-                k_values.append(np.nan)
-                d_values.append(np.nan)
-            else:
-                k = 2/3 * k + 1/3 * rsv.iloc[i]
-                d = 2/3 * d + 1/3 * k
-                k_values.append(k)
-                d_values.append(d)
-                
+        k_values, d_values = kdj_smooth(rsv.to_numpy(dtype=np.float64))
         df['k'] = k_values
         df['d'] = d_values
         df['j'] = 3 * df['k'] - 2 * df['d']
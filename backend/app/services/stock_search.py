@@ -7,6 +7,7 @@ import time
 import requests
 from typing import List, Dict, Any, Optional
 from app.utils.cache import SimpleCache as Cache
+from app.utils.timeout import call_with_timeout
 
 # Direct session (bypass macOS system proxy)
 _session = requests.Session()
@@ -31,10 +32,10 @@ def _load_stock_list() -> List[Dict[str, str]]:
 
     try:
         import akshare as ak
-        df = ak.stock_info_a_code_name()
+        df = call_with_timeout(ak.stock_info_a_code_name, timeout=60)  # several exchange lists
         _stock_list = [
-            {"code": str(row["code"]).zfill(6), "name": str(row["name"]).strip()}
-            for _, row in df.iterrows()
+            {"code": code.zfill(6), "name": name.strip()}
+            for code, name in df[["code", "name"]].astype(str).itertuples(index=False, name=None)
         ]
         _stock_list_ts = time.time()
         print(f"[StockSearch] Loaded {len(_stock_list)} stocks")
@@ -0,0 +1,16 @@
+"""
+Optional Numba JIT.
+Uses numba.njit when numba is installed, otherwise the decorated function runs as plain Python.
+"""
+
+try:
+    from numba import njit
+except ImportError:
+    def njit(*args, **kwargs):
+        # Support both @njit and @njit(cache=True, ...)
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+
+        def decorator(func):
+            return func
+        return decorator
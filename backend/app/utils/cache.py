@@ -1,19 +1,49 @@
 
 import time
 import functools
+import itertools
 import logging
-from typing import Any, Callable, Dict, Tuple
+import threading
+from typing import Any, Callable, Dict, Optional, Tuple
 
 logger = logging.getLogger(__name__)
 
-def ttl_cache(ttl: int = 60):
+# TTLs (seconds) by how fast each dataset actually changes upstream
+TTL_ANOMALIES = 5        # tick-level anomaly stream
+TTL_ANOMALY_SCAN = 3     # formatted scan result shared by concurrent pollers
+TTL_LEADERS = 30         # hot rank reshuffles constantly intraday
+TTL_ACTIVITY = 30        # up/down/limit counts
+TTL_SECTOR = 60          # sector aggregates
+TTL_MACRO = 3600         # scheduled economic calendar
+TTL_MACRO_DAY = 14400    # calendar for a fixed past/future date
+
+class _Flight:
+    """One in-progress fetch for a cache key; followers wait on `done`."""
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+def ttl_cache(ttl: int = 60, stale_after: float = 12, maxsize: Optional[int] = None, serve_stale: bool = True):
     """
     Simple TTL cache decorator.
     :param ttl: Time to live in seconds.
+    :param stale_after: Seconds a caller waits on another caller's refresh before
+        falling back to the expired value (if there is one).
+    :param maxsize: Optional cap on cached keys; the least recently refreshed key is evicted.
+    :param serve_stale: If False, an expired value is never returned: errors propagate and
+        slow refreshes are waited out (for data that is wrong once old, e.g. tick streams).
     Storage is per function instance closure.
+    Concurrent misses on the same key are collapsed into a single call (single flight):
+    the first caller fetches, the rest wait for its result.
     """
     def decorator(func: Callable):
         cache: Dict[Any, Tuple[Any, float]] = {}
+        inflight: Dict[Any, _Flight] = {}
+        inflight_guard = threading.Lock()
         
         @functools.wraps(func)
         def wrapper(*args, **kwargs):
@@ -26,26 +56,56 @@ def ttl_cache(ttl: int = 60):
                 logger.warning(f"Unhashable args in {func.__name__}, bypassing cache.")
                 return func(*args, **kwargs)
 
-            now = time.time()
             cached_val = cache.get(key)
+            if cached_val and time.monotonic() - cached_val[1] < ttl:
+                return cached_val[0]
             
-            if cached_val:
-                data, timestamp = cached_val
-                if now - timestamp < ttl:
-                    return data
-            
-            # Cache miss or expired
+            # Cache miss or expired: only one caller per key fetches
+            with inflight_guard:
+                # Another caller may have refreshed it while we took the guard
+                cached_val = cache.get(key)
+                if cached_val and time.monotonic() - cached_val[1] < ttl:
+                    return cached_val[0]
+                flight = inflight.get(key)
+                leader = flight is None
+                if leader:
+                    flight = inflight[key] = _Flight()
+
+            if not serve_stale:
+                cached_val = None  # expired: nothing to fall back to
+
+            if not leader:
+                if not flight.done.wait(stale_after) and cached_val:
+                    logger.warning(f"Refresh of {func.__name__} is slow, returning stale cache")
+                    return cached_val[0]
+                flight.done.wait()
+                if flight.error is None:
+                    return flight.result
+                if cached_val:
+                    return cached_val[0]
+                raise flight.error
+
             try:
                 result = func(*args, **kwargs)
-                cache[key] = (result, now)
+                cache.pop(key, None)  # re-insert at the end so eviction order follows refresh time
+                cache[key] = (result, time.monotonic())
+                if maxsize is not None:
+                    while len(cache) > maxsize:
+                        cache.pop(next(iter(cache)), None)
+                flight.result = result
                 return result
             except Exception as e:
+                flight.error = e
                 logger.error(f"Error fetching data in {func.__name__}: {e}")
                 # Fallback: return stale data if available
                 if cached_val:
                     logger.warning(f"Returning stale cache for {func.__name__}")
                     return cached_val[0]
                 raise e # Or return default?
+            finally:
+                with inflight_guard:
+                    inflight.pop(key, None)
+                flight.done.set()
         
         return wrapper
     return decorator
@@ -53,17 +113,36 @@ def ttl_cache(ttl: int = 60):
 class SimpleCache:
     """
     Simple in-memory cache with expiry.
+    One dict of key -> (expires_at, value) on the monotonic clock, so a read is a
+    single lookup and wall-clock jumps can't extend or cut short an entry.
+    Bounded: once `max_entries` is reached, `set` sweeps expired entries and then
+    evicts the oldest ones, so never-reread keys (e.g. per-prompt reports) can't pile up.
     """
-    _data = {}
-    _expiry = {}
+    max_entries = 1024
+    _store: Dict[str, Tuple[float, Any]] = {}
+    _write_lock = threading.Lock()
 
     @classmethod
     def get(cls, key: str) -> Any:
-        if key in cls._data and time.time() < cls._expiry.get(key, 0):
-            return cls._data[key]
+        item = cls._store.get(key)
+        if item is None:
+            return None
+        if item[0] > time.monotonic():
+            return item[1]
+        cls._store.pop(key, None)  # expired; drop it so keys don't pile up
         return None
 
     @classmethod
     def set(cls, key: str, value: Any, ttl: int = 60):
-        cls._data[key] = value
-        cls._expiry[key] = time.time() + ttl
+        now = time.monotonic()
+        with cls._write_lock:
+            store = cls._store
+            store.pop(key, None)  # re-insert at the end so eviction order follows write time
+            if len(store) >= cls.max_entries:
+                for k in [k for k, (expires_at, _) in store.items() if expires_at <= now]:
+                    store.pop(k, None)
+                # Still full: evict the oldest writes (dicts keep insertion order)
+                overflow = len(store) - cls.max_entries + 1
+                for k in list(itertools.islice(store, max(overflow, 0))):
+                    store.pop(k, None)
+            store[key] = (now + ttl, value)
@@ -0,0 +1,48 @@
+"""
+Per-call deadlines for blocking third-party data calls (AkShare).
+The caller stops waiting at the deadline; the socket default timeout set in app.main
+remains the backstop that eventually unblocks the worker itself.
+"""
+
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Any, Callable
+
+AKSHARE_TIMEOUT = 15  # seconds
+
+# Shared pool, created once and reused across calls.
+# A call that misses its deadline is NOT interrupted: Python can't kill a running thread,
+# and Future.cancel() has no effect once the call has started. Its worker stays busy until
+# the call returns on its own (at the latest when a socket read hits the default timeout).
+_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="akshare")
+
+
+def submit_call(func: Callable[..., Any], *args, **kwargs) -> Future:
+    """Start a blocking call on the shared pool without waiting (collect it with result_by)."""
+    return _executor.submit(func, *args, **kwargs)
+
+
+def result_by(future: Future, deadline: float, name: str = "call") -> Any:
+    """
+    Wait for `future` until the time.monotonic() `deadline`.
+    Several calls started together can share one deadline instead of each getting a full timeout.
+    Raises TimeoutError when the deadline passes.
+    """
+    try:
+        return future.result(timeout=max(0.0, deadline - time.monotonic()))
+    except FutureTimeoutError:
+        future.cancel()  # only helps if the call never started; a running worker is not reclaimed
+        raise TimeoutError(f"{name} timed out")
+
+
+def call_with_timeout(func: Callable[..., Any], *args, timeout: float = AKSHARE_TIMEOUT, **kwargs) -> Any:
+    """
+    Run a blocking call on the shared pool and wait at most `timeout` seconds.
+    Raises TimeoutError when the deadline passes (the worker keeps running the call; see above).
+    """
+    future = submit_call(func, *args, **kwargs)
+    try:
+        return future.result(timeout=timeout)
+    except FutureTimeoutError:
+        future.cancel()  # only helps if the call never started
+        raise TimeoutError(f"{getattr(func, '__name__', func)} timed out after {timeout}s")